@@ -0,0 +1,92 @@
+"""Micro benchmark of UniversalEncoder and write_dict_to_json_file
+
+python benchmarks/bench_json_encoder.py
+"""
+import datetime as dt
+import json
+import sys
+import tempfile
+import timeit
+from enum import Enum
+from pathlib import Path
+from types import GeneratorType
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from my_lib.file_lib import UniversalEncoder, write_dict_to_json_file  # noqa: E402
+
+
+class OldUniversalEncoder(json.JSONEncoder):
+    """UniversalEncoder before type dispatch cache"""
+    ENCODER_BY_TYPE = {
+        dt.datetime: lambda o: o.isoformat(),
+        dt.date: lambda o: o.isoformat(),
+        dt.time: lambda o: o.isoformat(),
+        set: list,
+        frozenset: list,
+        GeneratorType: list,
+        bytes: lambda o: o.decode(),
+    }
+
+    def default(self, o):
+        if isinstance(o, Enum):
+            return o.value
+        for k, v in self.ENCODER_BY_TYPE.items():
+            if isinstance(o, k):
+                encoder = v
+                return encoder(o)
+
+        if type(o) == "pydantic.main.BaseModel":
+            return o.dict()
+
+        try:
+            return super().default(o)
+        except TypeError:
+            try:
+                return o.__dict__
+            except AttributeError:
+                return str(o)
+
+
+class Item(object):
+    def __init__(self, n):
+        self.n = n
+        self.name = f"item {n}"
+
+
+def make_data(n=20000):
+    now = dt.datetime(2022, 1, 1, 12, 0, 0)
+    return [
+        {
+            "id": i,
+            "created": now + dt.timedelta(seconds=i),
+            "day": dt.date(2022, 1, 1 + i % 28),
+            "tags": {"a", "b", str(i % 10)},
+            "frozen": frozenset([i]),
+            "raw": b"bytes",
+            "obj": Item(i),
+        }
+        for i in range(n)
+    ]
+
+
+def main():
+    data = make_data()
+    number = 5
+    old = timeit.timeit(lambda: json.dumps(data, ensure_ascii=False, indent=2, cls=OldUniversalEncoder), number=number) / number
+    new = timeit.timeit(lambda: json.dumps(data, ensure_ascii=False, indent=2, cls=UniversalEncoder), number=number) / number
+    assert json.dumps(data, ensure_ascii=False, indent=2, cls=OldUniversalEncoder) == json.dumps(data, ensure_ascii=False, indent=2, cls=UniversalEncoder)
+    print(f"json.dumps  old encoder: {old * 1000:8.1f} ms")
+    print(f"json.dumps  new encoder: {new * 1000:8.1f} ms  ({old / new:.2f}x)")
+
+    with tempfile.TemporaryDirectory() as folder:
+        file_path = Path(folder) / "data.json"
+        slow = timeit.timeit(lambda: write_dict_to_json_file(file_path, data), number=number) / number
+        slow_data = file_path.read_text(encoding="utf-8")
+        fast = timeit.timeit(lambda: write_dict_to_json_file(file_path, data, b_fast=True), number=number) / number
+        fast_data = file_path.read_text(encoding="utf-8")
+    print(f"write_dict_to_json_file  json: {slow * 1000:8.1f} ms")
+    print(f"write_dict_to_json_file  fast: {fast * 1000:8.1f} ms  ({slow / fast:.2f}x, same output: {slow_data == fast_data})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""Benchmark of split_array_advance (heap) against the old implementation (min / index scan)
+
+python benchmarks/bench_split_array_advance.py
+"""
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from my_lib.thread_lib import split_array_advance  # noqa: E402
+
+
+def old_split_array_advance(data, item_name, part_num=2):
+    """split_array_advance before heap, O(n * part_num)"""
+    if part_num < 2:
+        return data
+
+    data = sorted(data, key=lambda x: x[item_name], reverse=True)
+    ret = []
+    arr_value = []
+
+    for _ in range(part_num):
+        ret.append([])
+        arr_value.append(0)
+
+    for val in data:
+        # find array has min value
+        i = arr_value.index(min(arr_value))
+        ret[i].append(val)
+        arr_value[i] += val[item_name]
+
+    return ret
+
+
+def timeit(func):
+    start = time.perf_counter()
+    ret = func()
+    return ret, time.perf_counter() - start
+
+
+def main():
+    random.seed(0)
+    for n, part_num in [(10000, 10), (200000, 100), (200000, 500)]:
+        data = [{"id": i, "size": random.randint(1, 1 << 20)} for i in range(n)]
+        old, old_time = timeit(lambda: old_split_array_advance(data, "size", part_num))
+        new, new_time = timeit(lambda: split_array_advance(data, "size", part_num))
+        print(f"n={n:>7} parts={part_num:>4}  old: {old_time * 1000:9.1f} ms  heap: {new_time * 1000:8.1f} ms  ({old_time / new_time:6.1f}x, same parts: {old == new})")
+
+    try:
+        import numpy as np
+    except ImportError:
+        print("numpy is not installed, skip weights path")
+        return
+    n, part_num = 1000000, 100
+    weights = np.random.default_rng(0).integers(1, 1 << 20, n)
+    data = list(range(n))
+    (_, totals), np_time = timeit(lambda: split_array_advance(data, part_num=part_num, weights=weights, b_total=True))
+    (_, list_totals), list_time = timeit(lambda: split_array_advance(data, part_num=part_num, weights=weights.tolist(), b_total=True))
+    print(f"n={n:>7} parts={part_num:>4}  list weights: {list_time * 1000:8.1f} ms  numpy weights: {np_time * 1000:8.1f} ms  "
+          f"(max - min total: {max(totals) - min(totals)}, same totals: {totals == list_totals})")
+
+
+if __name__ == "__main__":
+    main()
@@ -5,17 +5,39 @@ from __future__ import print_function  # Compatible python 2 and 3
 from types import GeneratorType
 from enum import Enum
 
+import atexit
+import codecs
+import collections
+import errno
+import hashlib
+import io
+import itertools
 import json
 import os
 import shutil
+import struct
+import sys
+import tempfile
 import zipfile
+import zlib
 import logging
+import logging.handlers
+import mmap
 import datetime as dt
-from .check_type import is_list, is_blank_str
+from array import array
+from .check_type import is_blank_str
 from .other_lib import get_python_version
 from pathlib import Path
-from typing import Union, List
+from typing import Union, List, Iterable, Iterator, Dict
 import fnmatch
+import glob
+import heapq
+import re
+import queue
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, wait, as_completed, FIRST_COMPLETED
 
 
 def __convert_path(file_path: Union[Path, str], b_check_exists: bool = False, b_create_parent: bool = False) -> Path:
@@ -43,40 +65,219 @@ def call_test__convert_path(file_path: Union[Path, str], b_check_exists=False):
     return __convert_path(file_path, b_check_exists=b_check_exists)
 
 
-def __glob_folder(folder: Path, pattern: str, is_folder=False, is_file=False, exclude_names: List[str] = None, is_exclude_names_case=True):
-    """_summary_
+def __compile_names(names: List[str], is_case=True):
+    """Compile list of fnmatch patterns to one regex
+
+    Args:
+        names (List[str]): ['*a.html', '???']
+        is_case (bool, optional): Case sensitive. Defaults to True.
+
+    Returns:
+        re.Pattern | None: None if names is empty
+    """
+    if not names:
+        return None
+    return re.compile('|'.join(fnmatch.translate(_) for _ in names), 0 if is_case else re.IGNORECASE)
+
+
+def __compile_pattern(pattern: str):
+    """Compile fnmatch pattern of file names (case insensitive on Windows)
+
+    Returns:
+        re.Pattern | None: None if pattern is '*' (all files)
+    """
+    if pattern == '*':
+        return None
+    return re.compile(fnmatch.translate(pattern), re.IGNORECASE if os.name == 'nt' else 0)
+
+
+def __scan_folder(folder: str, rel_folder: str, exclude_re=None, b_log_error=False):
+    """Scan one folder by os.scandir
+
+    Args:
+        folder (str): folder path
+        rel_folder (str): relative path of folder from root folder, '' for root folder
+        exclude_re (re.Pattern, optional): items match name or relative path will be ignored. Defaults to None.
+
+    Returns:
+        Tuple[List[os.DirEntry], List[os.DirEntry]]: (files, folders)
+    """
+    files = []
+    folders = []
+    try:
+        with os.scandir(folder) as it:
+            for entry in it:
+                if exclude_re is not None:
+                    if exclude_re.match(entry.name):
+                        continue
+                    if rel_folder and exclude_re.match(os.path.join(rel_folder, entry.name)):
+                        continue
+                try:
+                    if entry.is_dir():
+                        folders.append(entry)
+                    elif entry.is_file():
+                        files.append(entry)
+                except OSError:
+                    continue
+    except NotADirectoryError:
+        pass
+    except OSError as ex:
+        # Sub folder can not be read or was removed while scanning
+        if not rel_folder:
+            raise
+        if b_log_error:
+            logging.warning(f"Can not scan {folder}: {ex}")
+    return files, folders
+
+
+def __child_folders(folders: List[os.DirEntry], rel_folder: str, depth: int, level: int):
+    """Return list of (folder, relative folder, depth) will be scanned next"""
+    if level != -1 and depth >= level:
+        return []
+    # Same as glob('**'): do not descend into symlink folders when level is unlimited to avoid cycles
+    return [(entry.path, os.path.join(rel_folder, entry.name), depth + 1) for entry in folders if level != -1 or not entry.is_symlink()]
+
+
+def __walk_folder(folder: Path, level=-1, exclude_re=None, workers=1, b_order=False, b_log=False):
+    """Walk folder, yield (folder, relative folder, depth, files, folders) of each scanned folder
+
+    Args:
+        workers (int, optional): Number of threads scan sub folders. Defaults to 1.
+        b_order (bool, optional): Only with workers > 1. True: same order as 1 worker (depth first, parent before children),
+            False: yield folders as soon as they are scanned. Defaults to False.
+    """
+    if workers > 1:
+        yield from __walk_folder_parallel(folder, level=level, exclude_re=exclude_re, workers=workers, b_order=b_order, b_log=b_log)
+        return
+
+    stack = [(str(folder), '', 0)]
+    while stack:
+        cur_folder, rel_folder, depth = stack.pop()
+        files, folders = __scan_folder(cur_folder, rel_folder, exclude_re, b_log)
+        yield cur_folder, rel_folder, depth, files, folders
+        stack.extend(reversed(__child_folders(folders, rel_folder, depth, level)))
+
+
+def __walk_folder_parallel(folder: Path, level=-1, exclude_re=None, workers=2, b_order=False, b_log=False):
+    """Walk folder by a thread pool, each scanned folder submits scan jobs of its sub folders to the pool"""
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = queue.Queue()
+    pending = [1]
+    executor = ThreadPoolExecutor(max_workers=workers)
+
+    def scan(cur_folder, rel_folder, depth):
+        if stop.is_set():
+            return None
+        try:
+            files, folders = __scan_folder(cur_folder, rel_folder, exclude_re, b_log)
+            children = __child_folders(folders, rel_folder, depth, level)
+            node = (cur_folder, rel_folder, depth, files, folders)
+            if b_order:
+                return node, [executor.submit(scan, *_) for _ in children]
+
+            with lock:
+                pending[0] += len(children)
+            for _ in children:
+                executor.submit(scan, *_)
+            results.put(node)
+        except RuntimeError:
+            # executor was shut down
+            if not stop.is_set():
+                raise
+        except BaseException as ex:
+            if b_order:
+                raise
+            results.put(ex)
+        return None
+
+    try:
+        if b_order:
+            stack = [executor.submit(scan, str(folder), '', 0)]
+            while stack:
+                node, children = stack.pop().result()
+                yield node
+                stack.extend(reversed(children))
+        else:
+            executor.submit(scan, str(folder), '', 0)
+            while True:
+                node = results.get()
+                if isinstance(node, BaseException):
+                    raise node
+                yield node
+                with lock:
+                    pending[0] -= 1
+                    if pending[0] == 0:
+                        break
+    finally:
+        stop.set()
+        executor.shutdown(wait=True)
+
+
+def __iter_folder(folder: Path, pattern: str = '*', level=0, is_folder=False, is_file=False, b_print=False, b_log=False, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True, workers=1, b_order=False):
+    """Walk folder and yield matched items
+
+    Returns:
+        Iterator[Path]
+    """
+    pattern_re = __compile_pattern(pattern)
+    exclude_re = __compile_names(exclude_names, is_exclude_names_case)
+
+    for cur_folder, _, depth, files, folders in __walk_folder(folder, level=level, exclude_re=exclude_re, workers=workers, b_order=b_order, b_log=b_log):
+        if b_print:
+            print(cur_folder)
+        if b_log:
+            logging.info(cur_folder)
+
+        if level != -1 and b_only_leaf_folder and depth != level:
+            continue
+        items = []
+        if is_file:
+            items.extend(files)
+        if is_folder:
+            items.extend(folders)
+        for entry in items:
+            if pattern_re is None or pattern_re.match(entry.name):
+                yield Path(entry.path)
+
+
+def __check_list_params(folder: Union[Path, str], pattern: str, level: int):
+    if '/' in pattern:
+        raise ValueError('Pattern must not include /')
+    if not folder:
+        raise ValueError("folder is not empty or None")
+    if level < 0:
+        level = -1
+    return __convert_path(folder, b_check_exists=True), level
+
+
+def iter_sub_folders(folder: Union[Path, str], pattern: str = '*', level=0, b_print=False, b_log=False, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True, workers=1, b_order=False) -> Iterator[Path]:
+    """Iterate child folders of parent folder, folders are yielded while scanning
 
     Args:
         folder (str):
         pattern (str, optional): Defaults to '*'.
-        is_folder (bool, optional): return folders in result. Defaults to False.
-        is_file (bool, optional): return files in result. Defaults to False.
-        exclude_names (List[str], optional): ['*a.html', '???']. Defaults to None.
+        level:
+            -1: no limit
+            0: current folder
+        b_print (bool, optional): Show scanned folder path on screen. Defaults to False.
+        b_log (bool, optional): Show scanned folder path on logging. Defaults to False.
+        b_only_leaf_folder (bool, optional): Only show folders have in level=0. Defaults to False.
+        exclude_names (List[str], optional): ['*a.html', '???'], match name or relative path, excluded folders are not scanned. Defaults to None.
         is_exclude_names_case (bool, optional): Case sensitive on match exclude names. Defaults to True.
+        workers (int, optional): Number of threads scan sub folders in parallel. Defaults to 1.
+        b_order (bool, optional): Keep same order as workers=1 when workers > 1. Defaults to False.
 
     Returns:
-        _type_: _description_
+        Iterator[Path]: folders' path
     """
-    ret = []
-    if exclude_names is None:
-        exclude_names = []
-    compare_func = fnmatch.fnmatchcase if is_exclude_names_case else fnmatch.fnmatch
-    for item in folder.glob(pattern):
-        b_match = False
-        for ex_name in exclude_names:
-            relative_path = item.relative_to(folder)
-            if compare_func(str(relative_path), ex_name):
-                b_match = True
-                break
-        if not b_match:
-            if is_folder and item.is_dir():
-                ret.append(item)
-            if is_file and item.is_file():
-                ret.append(item)
-    return ret
+    folder, level = __check_list_params(folder, pattern, level)
+    return __iter_folder(folder, pattern=pattern, level=level, is_folder=True, b_print=b_print, b_log=b_log,
+                         b_only_leaf_folder=b_only_leaf_folder, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case,
+                         workers=workers, b_order=b_order)
 
 
-def list_sub_folders(folder: Union[Path, str], pattern: str = '*', level=0, b_print=False, b_log=False, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True) -> List[Path]:
+def list_sub_folders(folder: Union[Path, str], pattern: str = '*', level=0, b_print=False, b_log=False, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True, workers=1, b_order=False) -> List[Path]:
     """List child folders of parent folder
 
     Args:
@@ -90,43 +291,17 @@ def list_sub_folders(folder: Union[Path, str], pattern: str = '*', level=0, b_pr
         b_only_leaf_folder (bool, optional): Only show folders have in level=0. Defaults to False.
         exclude_names (List[str], optional): ['*a.html', '???']. Defaults to None.
         is_exclude_names_case (bool, optional): Case sensitive on match exclude names. Defaults to True.
+        workers (int, optional): Number of threads scan sub folders in parallel. Defaults to 1.
+        b_order (bool, optional): Keep same order as workers=1 when workers > 1. Defaults to False.
 
     Returns:
         List[Path]: list of folders' path
     """
-    if b_print:
-        print(folder)
-    if b_log:
-        logging.info(str(folder))
-
-    if level < 0:
-        level = -1
-    if '/' in pattern:
-        raise ValueError('Pattern must not include /')
-    if not folder:
-        raise ValueError("folder is not empty or None")
-    folder = __convert_path(folder, b_check_exists=True)
-    ret = []
-    if level == -1:
-        return __glob_folder(folder, pattern=f'**/{pattern}', is_folder=True, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case)
-
-    if b_only_leaf_folder and level == 0:
-        return __glob_folder(folder, pattern=pattern, is_folder=True, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case)
-    elif not b_only_leaf_folder:
-        ret = __glob_folder(folder, pattern=pattern, is_folder=True,
-                            exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case)
-
-    if (level > 0):
-        folders = __glob_folder(folder, pattern='*', is_folder=True,
-                                exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case)
-        for _ in folders:
-            ret.extend(list_sub_folders(_, pattern=pattern, level=level - 1, b_print=b_print, b_log=b_log,
-                                        b_only_leaf_folder=b_only_leaf_folder, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case))
+    return list(iter_sub_folders(folder, pattern=pattern, level=level, b_print=b_print, b_log=b_log, b_only_leaf_folder=b_only_leaf_folder,
+                                 exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case, workers=workers, b_order=b_order))
 
-    return ret
 
-
-def list_sub_folders_str(folder: Union[Path, str], pattern: str = '*', level=0, b_print=False, b_log=False, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True) -> List[str]:
+def list_sub_folders_str(folder: Union[Path, str], pattern: str = '*', level=0, b_print=False, b_log=False, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True, workers=1, b_order=False) -> List[str]:
     """List child folders of parent folder
 
     Args:
@@ -140,17 +315,46 @@ def list_sub_folders_str(folder: Union[Path, str], pattern: str = '*', level=0,
         b_only_leaf_folder (bool, optional): Only show folders have in level=0. Defaults to False.
         exclude_names (List[str], optional): ['*a.html', '???']. Defaults to None.
         is_exclude_names_case (bool, optional): Case sensitive on match exclude names. Defaults to True.
+        workers (int, optional): Number of threads scan sub folders in parallel. Defaults to 1.
+        b_order (bool, optional): Keep same order as workers=1 when workers > 1. Defaults to False.
 
     Returns:
         List[str]: _description_
     """
     ret = list_sub_folders(folder, pattern, level, b_print=b_print, b_log=b_log,
-            b_only_leaf_folder=b_only_leaf_folder, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case)
+            b_only_leaf_folder=b_only_leaf_folder, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case,
+            workers=workers, b_order=b_order)
     ret = [str(f) for f in ret]
     return ret
 
 
-def list_files(folder: Union[Path, str], pattern: str = '*', level=0, b_print=False, b_log=False, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True) -> List[Path]:
+def iter_files(folder: Union[Path, str], pattern: str = '*', level=0, b_print=False, b_log=False, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True, workers=1, b_order=False) -> Iterator[Path]:
+    """Iterate child files of parent folder, files are yielded while scanning
+
+    Args:
+        folder (Path | str)
+        pattern (str, optional): Defaults to '*'.
+        level:
+            -1: no limit
+            0: current folder
+        b_print (bool, optional): Show scanned folder path on screen. Defaults to False.
+        b_log (bool, optional): Show scanned folder path on logging. Defaults to False.
+        b_only_leaf_folder (bool, optional): Only show files have in level=0. Defaults to False.
+        exclude_names (List[str], optional): ['*a.html', '???'], match name or relative path, excluded folders are not scanned. Defaults to None.
+        is_exclude_names_case (bool, optional): Case sensitive on match exclude names. Defaults to True.
+        workers (int, optional): Number of threads scan sub folders in parallel. Defaults to 1.
+        b_order (bool, optional): Keep same order as workers=1 when workers > 1. Defaults to False.
+
+    Returns:
+        Iterator[Path]: files' path
+    """
+    folder, level = __check_list_params(folder, pattern, level)
+    return __iter_folder(folder, pattern=pattern, level=level, is_file=True, b_print=b_print, b_log=b_log,
+                         b_only_leaf_folder=b_only_leaf_folder, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case,
+                         workers=workers, b_order=b_order)
+
+
+def list_files(folder: Union[Path, str], pattern: str = '*', level=0, b_print=False, b_log=False, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True, workers=1, b_order=False) -> List[Path]:
     """List child files of parent folder
 
     Args:
@@ -164,44 +368,17 @@ def list_files(folder: Union[Path, str], pattern: str = '*', level=0, b_print=Fa
         b_only_leaf_folder (bool, optional): Only show files have in level=0. Defaults to False.
         exclude_names (List[str], optional): ['*a.html', '???']. Defaults to None.
         is_exclude_names_case (bool, optional): Case sensitive on match exclude names. Defaults to True.
+        workers (int, optional): Number of threads scan sub folders in parallel. Defaults to 1.
+        b_order (bool, optional): Keep same order as workers=1 when workers > 1. Defaults to False.
 
     Returns:
         List[Path]: list of files' path
     """
+    return list(iter_files(folder, pattern=pattern, level=level, b_print=b_print, b_log=b_log, b_only_leaf_folder=b_only_leaf_folder,
+                           exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case, workers=workers, b_order=b_order))
 
-    if '/' in pattern:
-        raise ValueError('Pattern must not include /')
-    if not folder:
-        raise ValueError("folder is not empty or None")
-    if b_print:
-        print(folder)
-    if b_log:
-        logging.info(str(folder))
 
-    if level < 0:
-        level = -1
-    folder = __convert_path(folder, b_check_exists=True)
-    ret = []
-    if level == -1:
-        return __glob_folder(folder, pattern=f'**/{pattern}', is_file=True, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case)
-
-    if b_only_leaf_folder and level == 0:
-        return __glob_folder(folder, pattern=pattern, is_file=True, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case)
-    elif not b_only_leaf_folder:
-        ret = __glob_folder(folder, pattern=pattern, is_file=True, exclude_names=exclude_names,
-                            is_exclude_names_case=is_exclude_names_case)
-
-    if (level > 0):
-        folders = __glob_folder(folder, pattern='*', is_folder=True, exclude_names=exclude_names,
-                                is_exclude_names_case=is_exclude_names_case)
-        for _ in folders:
-            ret.extend(list_files(_, pattern=pattern, level=level - 1, b_print=b_print,
-                                b_log=b_log, b_only_leaf_folder=b_only_leaf_folder, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case))
-
-    return ret
-
-
-def list_files_str(folder: Union[Path, str], pattern: str = '*', level=0, b_print=False, b_log=False, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True) -> List[str]:
+def list_files_str(folder: Union[Path, str], pattern: str = '*', level=0, b_print=False, b_log=False, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True, workers=1, b_order=False) -> List[str]:
     """List child files of parent folder
 
     Args:
@@ -213,16 +390,369 @@ def list_files_str(folder: Union[Path, str], pattern: str = '*', level=0, b_prin
         b_only_leaf_folder (bool, optional): Only show files have in level=0. Defaults to False.
         exclude_names (List[str], optional): ['*a.html', '???']. Defaults to None.
         is_exclude_names_case (bool, optional): Case sensitive on match exclude names. Defaults to True.
+        workers (int, optional): Number of threads scan sub folders in parallel. Defaults to 1.
+        b_order (bool, optional): Keep same order as workers=1 when workers > 1. Defaults to False.
 
     Returns:
         List[str]: _description_
     """
     ret = list_files(folder, pattern=pattern, level=level, b_print=b_print,
-                    b_log=b_log, b_only_leaf_folder=b_only_leaf_folder, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case)
+                    b_log=b_log, b_only_leaf_folder=b_only_leaf_folder, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case,
+                    workers=workers, b_order=b_order)
     ret = [str(f) for f in ret]
     return ret
 
 
+__INDEX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS folders (path TEXT PRIMARY KEY, parent TEXT, mtime_ns INTEGER);
+CREATE TABLE IF NOT EXISTS files (folder TEXT, name TEXT, size INTEGER, mtime_ns INTEGER, PRIMARY KEY (folder, name));
+CREATE INDEX IF NOT EXISTS folders_parent ON folders (parent);
+"""
+
+
+def __index_remove_folder(con, rel_folder: str, root: str, deleted: list):
+    """Remove folder and its sub folders from index, add their files to deleted"""
+    stack = [rel_folder]
+    while stack:
+        cur = stack.pop()
+        for name, in con.execute("SELECT name FROM files WHERE folder=?", (cur,)):
+            deleted.append(Path(os.path.join(root, cur, name)))
+        stack.extend(_ for _, in con.execute("SELECT path FROM folders WHERE parent=?", (cur,)))
+        con.execute("DELETE FROM files WHERE folder=?", (cur,))
+        con.execute("DELETE FROM folders WHERE path=?", (cur,))
+
+
+def update_folder_index(folder: Union[Path, str], index_file: Union[Path, str], exclude_names: List[str] = None, is_exclude_names_case=True, b_check_modified=True,
+                        callback=None) -> Dict[str, List[Path]]:
+    """Update persistent index (sqlite file) of all files in folder (level=-1).
+    Only folders whose mtime changed are scanned again.
+
+    Args:
+        folder (Path | str): root folder
+        index_file (Path | str): sqlite file stores index, index is rebuilt if folder or exclude_names changed
+        exclude_names (List[str], optional): ['*a.html', '???']. Defaults to None.
+        is_exclude_names_case (bool, optional): Case sensitive on match exclude names. Defaults to True.
+        b_check_modified (bool, optional): Modifying a file does not change mtime of its folder,
+            True: stat files in unchanged folders to find modified files. Defaults to True.
+        callback (function, optional): callback(result) is called before index is saved,
+            index is not changed if it raises (same changes are returned by next update). Defaults to None.
+
+    Returns:
+        Dict[str, List[Path]]: {'added': [...], 'modified': [...], 'deleted': [...]} since last update
+    """
+    folder = __convert_path(folder, b_check_exists=True)
+    index_file = __convert_path(index_file, b_create_parent=True)
+    exclude_re = __compile_names(exclude_names, is_exclude_names_case)
+    root = str(folder)
+    spec = json.dumps({'folder': str(folder.resolve()), 'exclude_names': exclude_names or [], 'case': is_exclude_names_case})
+    ret = {'added': [], 'modified': [], 'deleted': []}
+
+    con = sqlite3.connect(str(index_file))
+    try:
+        with con:
+            con.executescript(__INDEX_SCHEMA)
+            row = con.execute("SELECT value FROM meta WHERE key='spec'").fetchone()
+            if row is None or row[0] != spec:
+                con.execute("DELETE FROM folders")
+                con.execute("DELETE FROM files")
+                con.execute("INSERT OR REPLACE INTO meta VALUES ('spec', ?)", (spec,))
+
+            stack = ['']
+            while stack:
+                rel_folder = stack.pop()
+                cur_folder = os.path.join(root, rel_folder) if rel_folder else root
+                try:
+                    mtime_ns = os.stat(cur_folder).st_mtime_ns
+                except FileNotFoundError:
+                    __index_remove_folder(con, rel_folder, root, ret['deleted'])
+                    continue
+
+                row = con.execute("SELECT mtime_ns FROM folders WHERE path=?", (rel_folder,)).fetchone()
+                old_files = {_[0]: (_[1], _[2]) for _ in con.execute("SELECT name, size, mtime_ns FROM files WHERE folder=?", (rel_folder,))}
+
+                if row is not None and row[0] == mtime_ns:
+                    # Folder is unchanged: reuse its entries
+                    stack.extend(_ for _, in con.execute("SELECT path FROM folders WHERE parent=? ORDER BY path DESC", (rel_folder,)))
+                    if not b_check_modified:
+                        continue
+                    for name, (size, file_mtime_ns) in old_files.items():
+                        file_path = os.path.join(cur_folder, name)
+                        try:
+                            st = os.stat(file_path)
+                        except FileNotFoundError:
+                            continue
+                        if st.st_size != size or st.st_mtime_ns != file_mtime_ns:
+                            ret['modified'].append(Path(file_path))
+                            con.execute("UPDATE files SET size=?, mtime_ns=? WHERE folder=? AND name=?", (st.st_size, st.st_mtime_ns, rel_folder, name))
+                    continue
+
+                # Folder is new or changed: scan it again
+                files, folders = __scan_folder(cur_folder, rel_folder, exclude_re)
+                new_files = {}
+                for entry in files:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    new_files[entry.name] = (st.st_size, st.st_mtime_ns)
+                    if entry.name not in old_files:
+                        ret['added'].append(Path(entry.path))
+                    elif old_files[entry.name] != new_files[entry.name]:
+                        ret['modified'].append(Path(entry.path))
+                for name in old_files.keys() - new_files.keys():
+                    ret['deleted'].append(Path(os.path.join(cur_folder, name)))
+
+                sub_folders = [os.path.join(rel_folder, _.name) for _ in folders if not _.is_symlink()]
+                for path, in con.execute("SELECT path FROM folders WHERE parent=?", (rel_folder,)).fetchall():
+                    if path not in sub_folders:
+                        __index_remove_folder(con, path, root, ret['deleted'])
+
+                con.execute("DELETE FROM files WHERE folder=?", (rel_folder,))
+                con.executemany("INSERT INTO files VALUES (?, ?, ?, ?)", ((rel_folder, k, v[0], v[1]) for k, v in new_files.items()))
+                con.execute("INSERT OR REPLACE INTO folders VALUES (?, ?, ?)", (rel_folder, None if not rel_folder else os.path.dirname(rel_folder), mtime_ns))
+                stack.extend(reversed(sub_folders))
+            if callback:
+                callback(ret)
+    finally:
+        con.close()
+
+    return ret
+
+
+def list_files_by_index(folder: Union[Path, str], index_file: Union[Path, str], pattern: str = '*', level=-1, b_only_leaf_folder=False, exclude_names: List[str] = None, is_exclude_names_case=True) -> List[Path]:
+    """List child files of parent folder, using persistent index (see update_folder_index) to scan only changed folders
+
+    Args:
+        folder (Path | str)
+        index_file (Path | str): sqlite file stores index
+        pattern (str, optional): Defaults to '*'.
+        level:
+            -1: no limit
+            0: current folder
+        b_only_leaf_folder (bool, optional): Only show files have in level=0. Defaults to False.
+        exclude_names (List[str], optional): ['*a.html', '???']. Defaults to None.
+        is_exclude_names_case (bool, optional): Case sensitive on match exclude names. Defaults to True.
+
+    Returns:
+        List[Path]: list of files' path
+    """
+    folder, level = __check_list_params(folder, pattern, level)
+    update_folder_index(folder, index_file, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case, b_check_modified=False)
+    pattern_re = __compile_pattern(pattern)
+
+    ret = []
+    con = sqlite3.connect(str(index_file))
+    try:
+        for rel_folder, name in con.execute("SELECT folder, name FROM files ORDER BY folder, name"):
+            depth = rel_folder.count(os.sep) + 1 if rel_folder else 0
+            if level != -1 and (depth > level or (b_only_leaf_folder and depth != level)):
+                continue
+            if pattern_re is None or pattern_re.match(name):
+                ret.append(folder / rel_folder / name)
+    finally:
+        con.close()
+    return ret
+
+
+# Compression codecs of file suffixes, files are compressed / decompressed by streaming
+COMPRESSION_SUFFIXES = {".gz": "gzip", ".bz2": "bz2", ".xz": "xz", ".lzma": "lzma"}
+
+
+def __detect_compression(f_source, file_path: Union[Path, str]) -> str:
+    """Compression codec of opened binary file by magic bytes (or suffix), position of file is not changed
+
+    Returns:
+        str: 'gzip', 'bz2', 'xz', 'lzma' or None
+    """
+    head = f_source.peek(10)[:10]
+    if head[:3] == b"\x1f\x8b\x08":
+        return "gzip"
+    if head[:3] == b"BZh" and head[3:4] in b"123456789" and head[4:10] in (b"1AY&SY", b"\x17rE8P\x90"):
+        return "bz2"
+    if head[:6] == b"\xfd7zXZ\x00":
+        return "xz"
+    if head:
+        # .lzma (lzma alone) has no magic bytes
+        return COMPRESSION_SUFFIXES.get(Path(file_path).suffix.lower())
+    return None
+
+
+def __get_compression(file_path: Union[Path, str]) -> str:
+    """Compression codec of file by magic bytes (or suffix)"""
+    with open(file_path, "rb") as f_source:
+        return __detect_compression(f_source, file_path)
+
+
+def open_file(file_path: Union[Path, str], mode="r", encoding=None, errors=None, newline=None, buffering=-1, compresslevel: int = None, compress_workers=1):
+    """Open file same as open(), gzip / bz2 / xz / lzma files are decompressed or compressed by streaming.
+    Reading: codec is detected by magic bytes, writing: by suffix, appending: by existing data or suffix.
+
+    Args:
+        compresslevel (int, optional): Level of gzip / bz2 (1-9), preset of xz / lzma (0-9). Defaults to None (default of codec).
+        compress_workers (int, optional): Number of threads compress gzip file (ParallelGzipWriter). Defaults to 1.
+    """
+    b_binary = "b" in mode
+    base_mode = mode.replace("b", "").replace("t", "").replace("+", "")
+    if base_mode == "r":
+        f_source = open(file_path, "rb", buffering=buffering)
+        try:
+            codec = __detect_compression(f_source, file_path)
+        except Exception:
+            f_source.close()
+            raise
+        if codec is None:
+            return f_source if b_binary else io.TextIOWrapper(f_source, encoding=encoding, errors=errors, newline=newline)
+        f_source.close()
+    else:
+        codec = None
+        if base_mode == "a" and os.path.isfile(file_path) and os.path.getsize(file_path) > 0:
+            codec = __get_compression(file_path)
+        else:
+            codec = COMPRESSION_SUFFIXES.get(Path(file_path).suffix.lower())
+        if codec is None:
+            return open(file_path, mode, buffering=buffering, encoding=encoding, errors=errors, newline=newline)
+
+    binary_mode = base_mode + "b"
+    if codec == "gzip":
+        if base_mode != "r" and compress_workers > 1:
+            f = ParallelGzipWriter(file_path, binary_mode, compresslevel=compresslevel, workers=compress_workers)
+        else:
+            import gzip
+            f = gzip.open(file_path, binary_mode, compresslevel=9 if compresslevel is None else compresslevel)
+    elif codec == "bz2":
+        import bz2
+        f = bz2.open(file_path, binary_mode, compresslevel=9 if compresslevel is None else compresslevel)
+    else:
+        import lzma
+        if base_mode == "r":
+            f = lzma.open(file_path, binary_mode)
+        else:
+            f = lzma.open(file_path, binary_mode, format=lzma.FORMAT_ALONE if codec == "lzma" else lzma.FORMAT_XZ, preset=compresslevel)
+    return f if b_binary else io.TextIOWrapper(f, encoding=encoding, errors=errors, newline=newline)
+
+
+class ParallelGzipWriter(io.RawIOBase):
+    """Write gzip file, blocks of data are compressed by many threads (same as pigz).
+    Output is 1 gzip member, it is read by gzip module, gunzip...
+
+    Using
+        with ParallelGzipWriter("data.gz", workers=4) as f_dest:
+            f_dest.write(data)
+        write_str_to_file("data.txt.gz", s, compress_workers=4)
+    """
+    # Last bytes of previous block are dictionary of next block
+    __DICT_SIZE = 1 << 15
+
+    def __init__(self, file_path: Union[Path, str], mode="wb", compresslevel: int = None, workers=4, block_size=1 << 20):
+        """
+        Args:
+            file_path (Path | str): dest file
+            mode (str, optional): 'wb', 'ab' or 'xb'. Defaults to "wb".
+            compresslevel (int, optional): 1-9. Defaults to None (6).
+            workers (int, optional): Number of threads. Defaults to 4.
+            block_size (int, optional): Size of uncompressed block. Defaults to 1 MiB.
+        """
+        super().__init__()
+        if mode not in ("wb", "ab", "xb"):
+            raise ValueError("mode must be 'wb', 'ab' or 'xb'")
+        self.compresslevel = zlib.Z_DEFAULT_COMPRESSION if compresslevel is None else compresslevel
+        self.workers = max(workers, 1)
+        self.block_size = block_size
+        self.buffer = bytearray()
+        self.dict_data = b""
+        self.crc = 0
+        self.size = 0
+        self.futures = collections.deque()
+        self.f_dest = open(file_path, mode)
+        self.executor = ThreadPoolExecutor(max_workers=self.workers)
+        # Header: deflate, no flags, mtime, unknown OS
+        self.f_dest.write(b"\x1f\x8b\x08\x00" + struct.pack("<I", int(time.time())) + b"\x00\xff")
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        if self.closed:
+            raise ValueError("write to closed file")
+        n = len(data)
+        self.buffer += data
+        self.crc = zlib.crc32(data, self.crc)
+        self.size += n
+        while len(self.buffer) >= self.block_size:
+            block = bytes(self.buffer[:self.block_size])
+            del self.buffer[:self.block_size]
+            self.__submit(block, zlib.Z_SYNC_FLUSH)
+        return n
+
+    def __compress(self, block: bytes, zdict: bytes, mode: int) -> bytes:
+        if zdict:
+            compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15, zdict=zdict)
+        else:
+            compressor = zlib.compressobj(self.compresslevel, zlib.DEFLATED, -15)
+        return compressor.compress(block) + compressor.flush(mode)
+
+    def __submit(self, block: bytes, mode: int):
+        self.futures.append(self.executor.submit(self.__compress, block, self.dict_data, mode))
+        self.dict_data = block[-self.__DICT_SIZE:]
+        # Limit memory of blocks are waiting
+        while len(self.futures) > 2 * self.workers:
+            self.f_dest.write(self.futures.popleft().result())
+
+    def close(self):
+        """Compress last block, write trailer and close file"""
+        if self.closed:
+            return
+        try:
+            self.__submit(bytes(self.buffer), zlib.Z_FINISH)
+            self.buffer = bytearray()
+            while self.futures:
+                self.f_dest.write(self.futures.popleft().result())
+            self.f_dest.write(struct.pack("<II", self.crc & 0xFFFFFFFF, self.size & 0xFFFFFFFF))
+        finally:
+            self.executor.shutdown()
+            self.f_dest.close()
+            super().close()
+
+
+# Encodings which ' ', '\r', '\n' are 1 byte, data can be stripped before decoding
+__ASCII_COMPATIBLE_ENCODINGS = {"utf-8", "utf-8-sig", "ascii", "iso8859-1", "cp1252"}
+
+
+def __mmap_file(f_source):
+    """Memory map opened binary file, return None if file is empty or can not be mapped"""
+    try:
+        if os.fstat(f_source.fileno()).st_size == 0:
+            return None
+        return mmap.mmap(f_source.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        return None
+
+
+def load_file_to_bytes(file_path: Union[Path, str], b_mmap=False) -> Union[bytes, memoryview]:
+    """Load binary data of file
+
+    Args:
+        file_path (Path | str)
+        b_mmap (bool, optional): True: return read-only memoryview of memory mapped file (no copy,
+            data is read when it is accessed), call release() when done. Defaults to False.
+    Returns:
+        bytes | memoryview: data of file
+    """
+    file_path = __convert_path(file_path, b_check_exists=True)
+
+    with open(file_path, "rb") as f_source:
+        if __detect_compression(f_source, file_path) is None:
+            if not b_mmap:
+                return f_source.read()
+            mm = __mmap_file(f_source)
+            return memoryview(mm) if mm is not None else memoryview(f_source.read())
+
+    with open_file(file_path, "rb") as f_source:
+        data = f_source.read()
+    return memoryview(data) if b_mmap else data
+
+
 def load_file_to_str(file_path: Union[Path, str], encoding="utf-8", errors="ignore", b_rstrip=True) -> str:
     """_summary_
 
@@ -236,36 +766,97 @@ def load_file_to_str(file_path: Union[Path, str], encoding="utf-8", errors="igno
     """
     file_path = __convert_path(file_path, b_check_exists=True)
 
-    with open(file_path, "r", encoding=encoding, errors=errors) as f_source:
+    if codecs.lookup(encoding).name in __ASCII_COMPATIBLE_ENCODINGS:
+        # Decode direct from memory map, strip before decoding to avoid copying decoded string
+        with open(file_path, "rb") as f_source:
+            mm = __mmap_file(f_source) if __detect_compression(f_source, file_path) is None else None
+            if mm is not None:
+                with mm:
+                    end = len(mm)
+                    if b_rstrip:
+                        while end > 0 and mm[end - 1] in b" \r\n":
+                            end -= 1
+                    with memoryview(mm) as view:
+                        s = str(view[:end], encoding, errors)
+                    b_cr = mm.find(b"\r", 0, end) != -1
+                # Same as universal newlines mode of text file
+                if b_cr:
+                    s = s.replace("\r\n", "\n").replace("\r", "\n")
+                if b_rstrip:
+                    # Invalid bytes ignored by decoding may be after spaces
+                    s = s.rstrip(" \r\n")
+                return s
+
+    with open_file(file_path, "r", encoding=encoding, errors=errors) as f_source:
         s = f_source.read()
     if b_rstrip:
         s = s.rstrip(" \r\n")
     return s
 
 
-def load_file_to_list_str_n_head(file_path: Union[Path, str], b_remove_blank_str=False, encoding="utf-8", errors="ignore", row_num=10) -> List[str]:
-    """Load text unicode file to list(string)
+def __iter_file_lines(file_path: Path, b_remove_blank_str=False, encoding="utf-8", errors="ignore", buffer_size=1 << 20, start=None, stop=None):
+    if not start and stop is None:
+        with open_file(file_path, "r", encoding=encoding, errors=errors, buffering=buffer_size) as f_source:
+            for line in f_source:
+                line = line.rstrip("\r\n")
+                if not b_remove_blank_str or line.strip():
+                    yield line
+        return
+
+    start = start or 0
+    with open(file_path, "rb", buffering=buffer_size) as f_source:
+        pos = start
+        if start > 0:
+            # Line which contains byte start - 1 belongs to previous range
+            f_source.seek(start - 1)
+            pos += len(f_source.readline()) - 1
+        while stop is None or pos < stop:
+            line = f_source.readline()
+            if not line:
+                break
+            pos += len(line)
+            line = line.decode(encoding, errors).rstrip("\r\n")
+            if not b_remove_blank_str or line.strip():
+                yield line
+
+
+def iter_file_lines(file_path: Union[Path, str], b_remove_blank_str=False, encoding="utf-8", errors="ignore", buffer_size=1 << 20, start: int = None, stop: int = None) -> Iterator[str]:
+    """Iterate lines of text unicode file without loading whole file
 
     Args:
+        b_remove_blank_str (bool, optional): Skip blank lines. Defaults to False.
         encoding (str): default utf-8 (utf-8-sig: UTF8 with bom)
+        buffer_size (int, optional): Size of read buffer. Defaults to 1 MiB.
+        start (int, optional): Byte offset, yield lines start in [start, stop). Defaults to None.
+        stop (int, optional): Byte offset. Defaults to None (end of file).
+            Split file by byte ranges to read it by many workers, each line is in exactly one range.
+            With byte range, lines are split by \n only (a lone \r does not end a line),
+            encoding must use 1 byte for \n (utf-8, ascii, latin-1...)
     Returns:
-        List[str]: list of string containt file's content
+        Iterator[str]: lines without \r\n
     """
     file_path = __convert_path(file_path, b_check_exists=True)
+    if (start is not None and start < 0) or (stop is not None and stop < 0):
+        raise ValueError("start and stop must be >= 0")
+    if (start or stop is not None) and __get_compression(file_path) is not None:
+        raise ValueError("Byte range is not supported by compressed file")
+    return __iter_file_lines(file_path, b_remove_blank_str=b_remove_blank_str, encoding=encoding, errors=errors,
+                             buffer_size=buffer_size, start=start, stop=stop)
 
-    lines = []
-    n = 0
-    with open(file_path, "r", encoding=encoding, errors=errors) as f_source:
-        while n < row_num:
-            line = f_source.readline()
-            if len(line) == 0:
-                break
-            line = line.rstrip("\r\n")
-            if not b_remove_blank_str or not is_blank_str(line):
-                n += 1
-                lines.append(line)
 
-    return lines
+def load_file_to_list_str_n_head(file_path: Union[Path, str], b_remove_blank_str=False, encoding="utf-8", errors="ignore", row_num=10) -> List[str]:
+    """Load text unicode file to list(string)
+
+    Args:
+        encoding (str): default utf-8 (utf-8-sig: UTF8 with bom)
+    Returns:
+        List[str]: list of string containt file's content
+    """
+    lines = iter_file_lines(file_path, b_remove_blank_str=b_remove_blank_str, encoding=encoding, errors=errors, buffer_size=io.DEFAULT_BUFFER_SIZE)
+    try:
+        return list(itertools.islice(lines, max(row_num, 0)))
+    finally:
+        lines.close()
 
 
 def load_file_to_list_str(file_path: Union[Path, str], b_remove_blank_str=False, encoding="utf-8", errors="ignore") -> List[str]:
@@ -276,70 +867,315 @@ def load_file_to_list_str(file_path: Union[Path, str], b_remove_blank_str=False,
     Returns:
         List[str]: list of string containt file's content
     """
-    file_path = __convert_path(file_path, b_check_exists=True)
+    return list(iter_file_lines(file_path, b_remove_blank_str=b_remove_blank_str, encoding=encoding, errors=errors))
+
 
-    with open(file_path, "r", encoding=encoding, errors=errors) as f_source:
-        lines = f_source.readlines()
+def load_file_to_list_str_n_tail(file_path: Union[Path, str], b_remove_blank_str=False, encoding="utf-8", errors="ignore", row_num=10, block_size=1 << 16) -> List[str]:
+    """Load last row_num lines of text unicode file, file is read backward from its end
 
-    lines = [x.rstrip("\r\n") for x in lines if (
-        b_remove_blank_str and not is_blank_str(x)) or not b_remove_blank_str]
+    Args:
+        encoding (str): default utf-8 (utf-8-sig: UTF8 with bom)
+        row_num (int, optional): Defaults to 10.
+        block_size (int, optional): Size of first block read from end of file, next blocks are doubled. Defaults to 64 KiB.
+    Returns:
+        List[str]: last lines of file, same as load_file_to_list_str(...)[-row_num:]
+    """
+    file_path = __convert_path(file_path, b_check_exists=True)
+    if row_num <= 0:
+        return []
+
+    def read_all():
+        return list(collections.deque(iter_file_lines(file_path, b_remove_blank_str=b_remove_blank_str, encoding=encoding, errors=errors), maxlen=row_num))
+
+    if codecs.lookup(encoding).name not in __ASCII_COMPATIBLE_ENCODINGS or __get_compression(file_path) is not None:
+        return read_all()
+
+    with open(file_path, "rb") as f_source:
+        end = f_source.seek(0, os.SEEK_END)
+        if end == 0:
+            return []
+        # Newline of last line does not start a new line
+        f_source.seek(end - 1)
+        if f_source.read(1) == b"\n":
+            end -= 1
+        pos = end
+        blocks = []
+        while True:
+            read_size = min(block_size, pos)
+            pos -= read_size
+            f_source.seek(pos)
+            blocks.insert(0, f_source.read(read_size))
+            block_size *= 2
+            data = b"".join(blocks)
+            blocks = [data]
+            region = data[:end - pos]
+            m = re.search(rb"\r(?!\n)", region)
+            if m and m.end() < len(region):
+                # Lone \r ends a line in universal newlines mode, lines are not split by \n only
+                return read_all()
+            items = region.split(b"\n")
+            if pos > 0:
+                # First item may be part of a line
+                items = items[1:]
+            lines = [_.decode(encoding, errors).rstrip("\r") for _ in items]
+            if b_remove_blank_str:
+                lines = [_ for _ in lines if _.strip()]
+            if pos == 0 or len(lines) >= row_num:
+                return lines[-row_num:]
+
+
+class LineIndex(object):
+    """Byte offsets of line starts of text file, random access lines without reading whole file.
+    Offsets are stored in array('Q') and saved to file_path + '.lidx'.
+    Index is rebuilt when file is changed, or extended when data is only appended to file.
+    Lines are split by \\n, encoding must use 1 byte for \\n (utf-8, ascii, latin-1...), file must not be compressed
+
+    Using
+        index = LineIndex(file_path)
+        len(index)  # number of lines
+        index.get_lines(1000, 1010)
+    """
+    INDEX_SUFFIX = ".lidx"
+    __MAGIC = b"LIDX1\n"
+    __HEADER = struct.Struct("<6sQqQI")
+    # Check last bytes of indexed data before extending index
+    __CHECK_SIZE = 4096
+
+    def __init__(self, file_path: Union[Path, str], index_path: Union[Path, str] = None, b_persist=True):
+        """
+        Args:
+            file_path (Path | str): text file
+            index_path (Path | str, optional): Defaults to None: file_path + '.lidx'.
+            b_persist (bool, optional): Load and save index file. Defaults to True.
+        """
+        if not file_path:
+            raise ValueError("file_path is not None or empty")
+        self.file_path = Path(file_path)
+        if not self.file_path.is_file():
+            raise ValueError(f"{str(self.file_path)} is not found")
+        self.index_path = Path(index_path) if index_path else self.file_path.with_name(self.file_path.name + self.INDEX_SUFFIX)
+        self.b_persist = b_persist
+        self.offsets = array("Q", [0])
+        self.size = 0
+        self.mtime_ns = 0
+        self.check_crc = 0
+        if b_persist:
+            self.__load()
+        self.refresh()
+
+    def __load(self):
+        try:
+            with open(self.index_path, "rb") as f_index:
+                magic, n, self.size, self.mtime_ns, self.check_crc = self.__HEADER.unpack(f_index.read(self.__HEADER.size))
+                if magic != self.__MAGIC:
+                    raise ValueError("Not line index file")
+                offsets = array("Q")
+                offsets.frombytes(f_index.read(n * offsets.itemsize))
+                if len(offsets) != n or n == 0:
+                    raise ValueError("Line index file is truncated")
+        except (OSError, ValueError, struct.error):
+            self.offsets = array("Q", [0])
+            self.size = self.mtime_ns = self.check_crc = 0
+            return
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        self.offsets = offsets
+
+    def __save(self):
+        offsets = array("Q", self.offsets)
+        if sys.byteorder != "little":
+            offsets.byteswap()
+        tmp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+        try:
+            with open(tmp_path, "wb") as f_index:
+                f_index.write(self.__HEADER.pack(self.__MAGIC, len(offsets), self.size, self.mtime_ns, self.check_crc))
+                f_index.write(offsets.tobytes())
+            os.replace(tmp_path, self.index_path)
+        except OSError:
+            # Index file is only a cache
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+
+    def __crc_before(self, f_source, pos: int) -> int:
+        start = max(pos - self.__CHECK_SIZE, 0)
+        f_source.seek(start)
+        return zlib.crc32(f_source.read(pos - start))
+
+    def refresh(self) -> bool:
+        """Update index if file is changed
+
+        Returns:
+            bool: True if index is updated
+        """
+        st = os.stat(self.file_path)
+        if st.st_size == self.size and st.st_mtime_ns == self.mtime_ns:
+            return False
+
+        with open(self.file_path, "rb") as f_source:
+            if st.st_size < self.size or (st.st_size == self.size and self.size > 0) or self.__crc_before(f_source, self.size) != self.check_crc:
+                # File is rewritten
+                self.offsets = array("Q", [0])
+                self.size = 0
+            pos = self.size
+            f_source.seek(pos)
+            offsets = self.offsets
+            while pos < st.st_size:
+                buf = f_source.read(min(1 << 20, st.st_size - pos))
+                if not buf:
+                    break
+                i = buf.find(b"\n")
+                while i != -1:
+                    offsets.append(pos + i + 1)
+                    i = buf.find(b"\n", i + 1)
+                pos += len(buf)
+            self.size = pos
+            self.mtime_ns = st.st_mtime_ns
+            self.check_crc = self.__crc_before(f_source, pos)
+
+        if self.b_persist:
+            self.__save()
+        return True
+
+    def __len__(self):
+        # Last offset is end of file if file ends with \n
+        return len(self.offsets) - (1 if self.offsets[-1] == self.size else 0)
+
+    def get_range(self, start: int, stop: int = None):
+        """Byte range of lines [start, stop), same index as list slice
+
+        Returns:
+            (int, int, int): start byte, stop byte, number of lines
+        """
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return 0, 0, 0
+        return self.offsets[start], self.offsets[stop] if stop < len(self.offsets) else self.size, stop - start
+
+    def get_lines(self, start: int, stop: int = None, encoding="utf-8", errors="ignore") -> List[str]:
+        """Lines [start, stop) of file, same index as list slice
+
+        Args:
+            start (int): line number, from 0
+            stop (int, optional): Defaults to None (end of file).
+            encoding (str, optional): Defaults to "utf-8".
+        Returns:
+            List[str]: lines without \\r\\n
+        """
+        byte_start, byte_stop, n = self.get_range(start, stop)
+        if n == 0:
+            return []
+        with open(self.file_path, "rb") as f_source:
+            f_source.seek(byte_start)
+            data = f_source.read(byte_stop - byte_start)
+        return [_.decode(encoding, errors).rstrip("\r") for _ in data.split(b"\n")[:n]]
+
+
+def get_lines(file_path: Union[Path, str], start: int, stop: int = None, encoding="utf-8", errors="ignore", b_persist=True) -> List[str]:
+    """Lines [start, stop) of text unicode file by LineIndex, same index as list slice
 
-    return lines
+    Args:
+        file_path (Path | str)
+        start (int): line number, from 0
+        stop (int, optional): Defaults to None (end of file).
+        encoding (str, optional): Defaults to "utf-8".
+        b_persist (bool, optional): Load and save index file (file_path + '.lidx'). Defaults to True.
+    Returns:
+        List[str]: lines without \r\n
+    """
+    file_path = __convert_path(file_path, b_check_exists=True)
+    if __get_compression(file_path) is not None:
+        raise ValueError("Line index is not supported by compressed file")
+    return LineIndex(file_path, b_persist=b_persist).get_lines(start, stop, encoding=encoding, errors=errors)
 
 
-def write_str_to_file(file_path: Union[Path, str], data: str, encoding="utf-8", newline="\n"):
-    """Write string data to text unicode file
+def write_str_to_file(file_path: Union[Path, str], data: str, encoding="utf-8", newline="\n", compresslevel: int = None, compress_workers=1):
+    """Write string data to text unicode file, file is compressed if its suffix is .gz, .bz2, .xz, .lzma
 
     Args:
         encoding (str): default utf-8 (utf-8-sig: UTF8 with bom)
         newline (str): None, '', '\\n', '\\r', and '\\r\\n'
+        compresslevel (int, optional): Level of gzip / bz2 (1-9), preset of xz / lzma (0-9). Defaults to None (default of codec).
+        compress_workers (int, optional): Number of threads compress gzip file. Defaults to 1.
     """
     file_path = __convert_path(file_path, b_create_parent=True)
     if is_blank_str(data):
         raise ValueError("data is not empty")
 
-    with open(file_path, "w+", encoding=encoding, newline=newline) as f_dest:
+    with open_file(file_path, "w+", encoding=encoding, newline=newline, compresslevel=compresslevel, compress_workers=compress_workers) as f_dest:
         f_dest.write(data)
 
 
-def write_list_str_to_file(file_path: Union[Path, str], data: List[str], b_remove_blank_str=False, newline="\n", encoding="utf-8"):
-    """Write list of string to unicode file
+def __iter_list_str_lines(data, b_remove_blank_str=False, newline="\n") -> Iterator[str]:
+    """Add newline to end of items, remove newline of last item (look ahead 1 item)"""
+    prev = None
+    for item in data:
+        if b_remove_blank_str and is_blank_str(item):
+            continue
+        if not item.endswith(newline):
+            item += newline
+        if prev is not None:
+            yield prev
+        prev = item
+
+    # remove last blank line
+    if prev is not None:
+        yield prev.rstrip("\r\n")
+
+
+def __write_buffered(f_dest, data, buffer_size=1 << 20):
+    """Write strings to file, join them to chunks of about buffer_size characters"""
+    buffer = []
+    buffer_len = 0
+    for item in data:
+        buffer.append(item)
+        buffer_len += len(item)
+        if buffer_len >= buffer_size:
+            f_dest.write("".join(buffer))
+            buffer = []
+            buffer_len = 0
+    if buffer:
+        f_dest.write("".join(buffer))
+
+
+def write_list_str_to_file(file_path: Union[Path, str], data: Iterable[str], b_remove_blank_str=False, newline="\n", encoding="utf-8", buffer_size=1 << 20,
+                           compresslevel: int = None, compress_workers=1):
+    """Write list of string to unicode file, file is compressed if its suffix is .gz, .bz2, .xz, .lzma
 
     Args:
+        data (Iterable[str]): list, generator... items are written while iterating
         encoding (str): default utf-8 (utf-8-sig: UTF8 with bom)
         newline (str): None, '', '\\n', '\\r', and '\\r\\n'
+        buffer_size (int, optional): Write about buffer_size characters at a time. Defaults to 1 MiB.
+        compresslevel (int, optional): Level of gzip / bz2 (1-9), preset of xz / lzma (0-9). Defaults to None (default of codec).
+        compress_workers (int, optional): Number of threads compress gzip file. Defaults to 1.
     """
     file_path = __convert_path(file_path, b_create_parent=True)
-    if not is_list(data):
+    if isinstance(data, str) or not hasattr(data, "__iter__"):
         raise ValueError("data must be list(str)")
 
-    new_data = []
-    for item in data:
-        if b_remove_blank_str and is_blank_str(item):
-            continue
-        if item.endswith(newline):
-            new_data.append(item)
-        else:
-            new_data.append(item + newline)
-
-    # remove last blank line
-    if new_data:
-        new_data[-1] = new_data[-1].rstrip("\r\n")
-
-    with open(file_path, "w+", newline=newline, encoding=encoding) as f_dest:
-        f_dest.writelines(new_data)
+    with open_file(file_path, "w+", newline=newline, encoding=encoding, compresslevel=compresslevel, compress_workers=compress_workers) as f_dest:
+        __write_buffered(f_dest, __iter_list_str_lines(data, b_remove_blank_str=b_remove_blank_str, newline=newline), buffer_size=buffer_size)
 
 
-def append_str_to_file(file_path: Union[Path, str], data, encoding="utf-8", lock=None):
-    """Append string data to end of unicode file
+def append_str_to_file(file_path: Union[Path, str], data, encoding="utf-8", lock=None, compresslevel: int = None):
+    """Append string data to end of unicode file, compressed file (gzip, bz2, xz, lzma) is appended 1 compressed member
 
     Args:
         file_path (str): path of source file
         data (str): data
         encoding (str): default utf-8 (utf-8-sig: UTF8 with bom)
-        lock: using when running thread
+        lock: using when running thread, AppendWriter of file_path: data is added to its buffer
+        compresslevel (int, optional): Level of gzip / bz2 (1-9), preset of xz / lzma (0-9). Defaults to None (default of codec).
     """
 
+    if isinstance(lock, AppendWriter):
+        if is_blank_str(data):
+            raise ValueError("data is not empty")
+        lock.write(data, file_path=file_path)
+        return
+
     file_path = __convert_path(file_path, b_create_parent=True)
     if is_blank_str(data):
         raise ValueError("data is not empty")
@@ -348,7 +1184,7 @@ def append_str_to_file(file_path: Union[Path, str], data, encoding="utf-8", lock
         # acquire the lock
         lock.acquire()
 
-    with open(file_path, "a", encoding=encoding) as f_dest:
+    with open_file(file_path, "a", encoding=encoding, compresslevel=compresslevel) as f_dest:
         f_dest.write(data)
 
     if lock:
@@ -356,71 +1192,314 @@ def append_str_to_file(file_path: Union[Path, str], data, encoding="utf-8", lock
         lock.release()
 
 
-def append_list_str_to_file(file_path: Union[Path, str], data: List[str], b_remove_blank_str=False, newline="\n", encoding="utf-8", lock=None):
-    """Append string data to end of unicode file
+def __iter_join_list_str(data, b_remove_blank_str=False, newline="\n") -> Iterator[str]:
+    """Items of append_list_str_to_file, last item has no newline (look ahead 1 item)"""
+    it = iter(data)
+    try:
+        item = next(it)
+    except StopIteration:
+        return
+    for next_item in it:
+        if not (b_remove_blank_str and is_blank_str(item)):
+            yield item.rstrip("\r\n") + newline
+        item = next_item
+
+    # Remove \r \n in last line
+    if not (b_remove_blank_str and is_blank_str(item)):
+        yield item.rstrip(newline)
+
+
+def append_list_str_to_file(file_path: Union[Path, str], data: Iterable[str], b_remove_blank_str=False, newline="\n", encoding="utf-8", lock=None, buffer_size=1 << 20,
+                            compresslevel: int = None, compress_workers=1):
+    """Append string data to end of unicode file, compressed file (gzip, bz2, xz, lzma) is appended 1 compressed member
 
     Args:
+        data (Iterable[str]): list, generator... items are written while iterating
         encoding (str): default utf-8 (utf-8-sig: UTF8 with bom)
         newline (str): None, '', '\\n', '\\r', and '\\r\\n'
-        lock: using when running thread
+        lock: using when running thread, AppendWriter of file_path: data is added to its buffer
+        buffer_size (int, optional): Write about buffer_size characters at a time. Defaults to 1 MiB.
+        compresslevel (int, optional): Level of gzip / bz2 (1-9), preset of xz / lzma (0-9). Defaults to None (default of codec).
+        compress_workers (int, optional): Number of threads compress gzip file. Defaults to 1.
     """
-    file_path = __convert_path(file_path, b_create_parent=True)
-    if not is_list(data):
+    if isinstance(data, str) or not hasattr(data, "__iter__"):
         raise ValueError("data must be list(str)")
+    if isinstance(lock, AppendWriter):
+        # 1 write keeps lines of data together
+        lock.write("".join(__iter_join_list_str(data, b_remove_blank_str=b_remove_blank_str, newline=newline)), file_path=file_path)
+        return
+
+    file_path = __convert_path(file_path, b_create_parent=True)
 
-    n = len(data)
     if lock:
         # acquire the lock
         lock.acquire()
 
-    with open(file_path, "a", encoding=encoding, newline=newline) as f_dest:
-        for i, item in enumerate(data):
-            if b_remove_blank_str and is_blank_str(item):
-                continue
+    try:
+        with open_file(file_path, "a", encoding=encoding, newline=newline, compresslevel=compresslevel, compress_workers=compress_workers) as f_dest:
+            __write_buffered(f_dest, __iter_join_list_str(data, b_remove_blank_str=b_remove_blank_str, newline=newline), buffer_size=buffer_size)
+    finally:
+        if lock:
+            lock.release()
 
-            if i < n - 1:
-                item = item.rstrip("\r\n") + newline
 
-            # Remove \r \n in last line
-            if i == n - 1:
-                item = item.rstrip(newline)
+class AppendWriter(object):
+    """Append strings to end of file from many threads.
+    Data is added to a buffer, a background thread writes buffer to file (1 write for many calls)
+    when buffer is full or after flush_interval seconds. File is opened once.
 
-            f_dest.write(item)
-    if lock:
-        # acquire the lock
-        lock.release()
+    Using
+        with AppendWriter(file_path) as writer:
+            thread_execute(func=func, list_arr=items)  # func calls writer.write(data)
+                                                       # or append_str_to_file(file_path, data, lock=writer)
+    """
 
+    def __init__(self, file_path: Union[Path, str], encoding="utf-8", newline=None, buffer_size=1 << 20, flush_interval=1.0, compresslevel: int = None):
+        """
+        Args:
+            file_path (Path | str): dest file
+            encoding (str): default utf-8 (utf-8-sig: UTF8 with bom)
+            newline (str): None, '', '\\n', '\\r', and '\\r\\n'
+            buffer_size (int, optional): Write buffer when it has more than buffer_size characters. Defaults to 1 MiB.
+                write() is blocked if writer thread can not catch up (buffer has more than 4 * buffer_size characters).
+            flush_interval (float, optional): Write buffer after flush_interval seconds. Defaults to 1.0.
+            compresslevel (int, optional): Level of gzip / bz2 (1-9), preset of xz / lzma (0-9) of compressed file. Defaults to None (default of codec).
+        """
+        if isinstance(file_path, str):
+            file_path = file_path.strip()
+        if not file_path:
+            raise ValueError("file_path is not None or empty")
+        self.file_path = Path(file_path)
+        self.file_path.parent.mkdir(exist_ok=True, parents=True)
+        # Absolute path to check file_path of write()
+        self.resolved_path = self.file_path.resolve()
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self.f_dest = open_file(self.file_path, "a", encoding=encoding, newline=newline, compresslevel=compresslevel)
+        self.buffer = []
+        self.buffer_len = 0
+        self.error = None
+        self.closed = False
+        self.cond = threading.Condition()
+        # Only 1 thread swaps and writes buffer at a time, keep order of data
+        self.write_lock = threading.Lock()
+        self.thread = threading.Thread(target=self.__run, name=f"AppendWriter-{self.file_path.name}", daemon=True)
+        self.thread.start()
+
+    def write(self, data: str, file_path: Union[Path, str] = None):
+        """Add data to buffer
+
+        Args:
+            data (str): data
+            file_path (Path | str, optional): check file_path is file of this writer. Defaults to None.
+        """
+        if file_path is not None:
+            if isinstance(file_path, str):
+                file_path = file_path.strip()
+            if Path(file_path) != self.file_path and Path(file_path).resolve() != self.resolved_path:
+                raise ValueError(f"AppendWriter of {self.file_path} can not write to {file_path}")
+        if self.error:
+            raise self.error
+        with self.cond:
+            if self.closed:
+                raise ValueError("AppendWriter is closed")
+            while self.buffer_len >= 4 * self.buffer_size and not self.error and not self.closed:
+                self.cond.wait()
+            # Writer can be closed or failed while waiting
+            if self.error:
+                raise self.error
+            if self.closed:
+                raise ValueError("AppendWriter is closed")
+            self.buffer.append(data)
+            self.buffer_len += len(data)
+            if self.buffer_len >= self.buffer_size:
+                self.cond.notify_all()
+
+    def __write_buffer(self):
+        with self.write_lock:
+            with self.cond:
+                data = "".join(self.buffer)
+                self.buffer = []
+                self.buffer_len = 0
+                self.cond.notify_all()
+            if data:
+                self.f_dest.write(data)
+                self.f_dest.flush()
+
+    def __run(self):
+        try:
+            while True:
+                with self.cond:
+                    self.cond.wait_for(lambda: self.closed or self.buffer_len >= self.buffer_size, timeout=self.flush_interval)
+                    closed = self.closed
+                self.__write_buffer()
+                if closed:
+                    break
+        except Exception as ex:
+            self.error = ex
+            with self.cond:
+                self.cond.notify_all()
+
+    def flush(self):
+        """Write buffer to file now"""
+        if self.error:
+            raise self.error
+        self.__write_buffer()
+
+    def close(self):
+        """Write buffer, stop writer thread and close file"""
+        with self.cond:
+            if self.closed:
+                return
+            self.closed = True
+            self.cond.notify_all()
+        self.thread.join()
+        self.f_dest.close()
+        if self.error:
+            raise self.error
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# File types are compressed already, create_zip stores them without compression
+ZIP_STORED_TYPES = ['zip', 'gz', 'tgz', 'bz2', 'xz', 'lzma', 'zst', '7z', 'rar', 'jar', 'whl', 'docx', 'xlsx', 'pptx',
+                    'jpg', 'jpeg', 'png', 'gif', 'webp', 'heic', 'mp3', 'mp4', 'm4a', 'mkv', 'avi', 'mov', 'webm', 'ogg', 'flac', 'woff2']
+
+
+def __zip_compress_file(file_path: str, compress_type: int, compresslevel: int = None, spool_size=32 << 20):
+    """Compress file to a temporary file (in memory if it is small)
 
-def create_zip(src: Union[Path, str], dst: Union[Path, str] = None):
+    Returns:
+        Tuple[int, int, SpooledTemporaryFile]: (crc, file size, compressed data)
+    """
+    compressor = None
+    if compress_type == zipfile.ZIP_DEFLATED:
+        compressor = zlib.compressobj(zlib.Z_DEFAULT_COMPRESSION if compresslevel is None else compresslevel, zlib.DEFLATED, -15)
+    crc = 0
+    file_size = 0
+    data = tempfile.SpooledTemporaryFile(max_size=spool_size)
+    with open(file_path, "rb") as f_source:
+        while True:
+            buf = f_source.read(1 << 20)
+            if not buf:
+                break
+            file_size += len(buf)
+            crc = zlib.crc32(buf, crc)
+            data.write(compressor.compress(buf) if compressor else buf)
+    if compressor:
+        data.write(compressor.flush())
+    data.seek(0)
+    return crc, file_size, data
+
+
+def __zip_can_write_compressed(zf: zipfile.ZipFile) -> bool:
+    """Check internals of ZipFile used by __zip_write_compressed, they are not public API and may change"""
+    return (hasattr(zf, "_lock") and hasattr(zf._lock, "__enter__")
+            and callable(getattr(zf, "_writecheck", None))
+            and hasattr(zf, "_didModify")
+            and not getattr(zf, "_writing", False)
+            and getattr(zf, "_seekable", False)
+            and isinstance(getattr(zf, "start_dir", None), int)
+            and hasattr(zf.fp, "write") and hasattr(zf.fp, "seek") and hasattr(zf.fp, "tell")
+            and isinstance(getattr(zf, "filelist", None), list)
+            and isinstance(getattr(zf, "NameToInfo", None), dict)
+            and callable(getattr(zipfile.ZipInfo, "FileHeader", None)))
+
+
+def __zip_write_compressed(zf: zipfile.ZipFile, zinfo: zipfile.ZipInfo, crc: int, file_size: int, data):
+    """Write compressed data of 1 member to zip file, same as ZipFile.write (local header, data, then central directory at close)"""
+    compress_size = data.seek(0, os.SEEK_END)
+    data.seek(0)
+    with zf._lock:
+        zinfo.flag_bits = 0x00
+        if not zinfo.external_attr:
+            zinfo.external_attr = 0o600 << 16
+        zinfo.file_size = file_size
+        zinfo.compress_size = compress_size
+        zinfo.CRC = crc
+        zip64 = file_size * 1.05 > zipfile.ZIP64_LIMIT or compress_size > zipfile.ZIP64_LIMIT
+        zf.fp.seek(zf.start_dir)
+        zinfo.header_offset = zf.fp.tell()
+        zf._writecheck(zinfo)
+        zf._didModify = True
+        zf.fp.write(zinfo.FileHeader(zip64))
+        shutil.copyfileobj(data, zf.fp, 1 << 20)
+        zf.start_dir = zf.fp.tell()
+        zf.filelist.append(zinfo)
+        zf.NameToInfo[zinfo.filename] = zinfo
+
+
+def create_zip(src: Union[Path, str], dst: Union[Path, str] = None, compresslevel: int = None, workers=1, store_types: List[str] = None):
     """Create a zip file
 
     Args:
         src : source folder
         dst : dest file
-
+        compresslevel (int, optional): 0 (no compression) - 9 (best compression). Defaults to None (6).
+        workers (int, optional): Number of threads compress files, files are written in order. Defaults to 1.
+        store_types (List[str], optional): Store files have these types without compression. Defaults to ZIP_STORED_TYPES.
     """
     src = __convert_path(src)
     dst = __convert_path(dst, b_create_parent=True) if dst else src
 
     if dst.suffix != 'zip':
         dst = dst.with_suffix(".zip")
+    if store_types is None:
+        store_types = ZIP_STORED_TYPES
+    store_types = {_.lower().lstrip('.') for _ in store_types}
+
+    def get_compress_type(file_name):
+        return zipfile.ZIP_STORED if os.path.splitext(file_name)[1].lower().lstrip('.') in store_types else zipfile.ZIP_DEFLATED
 
     zf = zipfile.ZipFile(dst, "w", zipfile.ZIP_DEFLATED)
     abs_src = os.path.abspath(src)
+    members = []
     for dirname, _, files in os.walk(src):
         for filename in files:
             absname = os.path.abspath(os.path.join(dirname, filename))
             arcname = absname[len(abs_src) + 1:]
-            zf.write(absname, arcname)
-    zf.close()
+            members.append((absname, arcname))
 
+    try:
+        if workers <= 1 or not __zip_can_write_compressed(zf):
+            # Internals of ZipFile are changed: files are compressed by public API
+            for absname, arcname in members:
+                zf.write(absname, arcname, compress_type=get_compress_type(arcname), compresslevel=compresslevel)
+            return
+
+        # Compress files by threads (zlib releases GIL), write them in order, keep at most 2 * workers compressed files
+        jobs = collections.deque()
+
+        def write_next():
+            zinfo, job = jobs.popleft()
+            crc, file_size, data = job.result()
+            with data:
+                __zip_write_compressed(zf, zinfo, crc, file_size, data)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for absname, arcname in members:
+                zinfo = zipfile.ZipInfo.from_file(absname, arcname)
+                zinfo.compress_type = get_compress_type(arcname)
+                jobs.append((zinfo, executor.submit(__zip_compress_file, absname, zinfo.compress_type, compresslevel)))
+                if len(jobs) >= 2 * workers:
+                    write_next()
+            while jobs:
+                write_next()
+    finally:
+        zf.close()
 
-def extract_zip(src: Union[Path, str], dst: Union[Path, str] = None):
+
+def extract_zip(src: Union[Path, str], dst: Union[Path, str] = None, workers=1):
     """Create a zip file
 
     Args:
         src : source folder
         dst : dest file
+        workers (int, optional): Number of threads extract files. Defaults to 1.
     """
 
     if not src:
@@ -432,7 +1511,44 @@ def extract_zip(src: Union[Path, str], dst: Union[Path, str] = None):
     dst.mkdir(exist_ok=True, parents=True)
 
     with zipfile.ZipFile(src, "r") as zip_ref:
-        zip_ref.extractall(dst)
+        if workers <= 1:
+            zip_ref.extractall(dst)
+            return
+        members = zip_ref.infolist()
+
+    # Create folders first, threads do not create same folder at the same time
+    folders = set()
+    for member in members:
+        arcname = os.path.splitdrive(member.filename.replace('/', os.path.sep))[1]
+        parts = [_ for _ in arcname.split(os.path.sep) if _ not in ('', os.path.curdir, os.path.pardir)]
+        if not member.is_dir():
+            parts = parts[:-1]
+        if parts:
+            folders.add(os.path.join(dst, *parts))
+    for _ in sorted(folders):
+        os.makedirs(_, exist_ok=True)
+
+    local = threading.local()
+    zip_refs = []
+
+    def extract(member):
+        if not hasattr(local, "zip_ref"):
+            local.zip_ref = zipfile.ZipFile(src, "r")
+            zip_refs.append(local.zip_ref)
+        try:
+            local.zip_ref.extract(member, dst)
+        except FileExistsError:
+            # Folder is created by other thread
+            local.zip_ref.extract(member, dst)
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Big files first
+            for _ in executor.map(extract, sorted(members, key=lambda x: x.file_size, reverse=True)):
+                pass
+    finally:
+        for _ in zip_refs:
+            _.close()
 
 
 def create_folder(dest_folder: Union[Path, str], force_delete=False):
@@ -468,7 +1584,7 @@ def load_json_file(
     """
     file_path = __convert_path(file_path, b_check_exists=True)
     python_v = get_python_version()
-    with open(file_path, "r", encoding=encoding) as f_source:
+    with open_file(file_path, "r", encoding=encoding) as f_source:
         if python_v[0]>=3 and python_v[1]>=9:
             json_data = json.load(
                 f_source,
@@ -492,6 +1608,7 @@ def load_json_file(
 
 class UniversalEncoder(json.JSONEncoder):
     ENCODER_BY_TYPE = {
+        Enum: lambda o: o.value,
         dt.datetime: lambda o: o.isoformat(),
         dt.date: lambda o: o.isoformat(),
         dt.time: lambda o: o.isoformat(),
@@ -500,53 +1617,112 @@ class UniversalEncoder(json.JSONEncoder):
         GeneratorType: list,
         bytes: lambda o: o.decode(),
     }
+    # Increased by register_type of any class, caches of all classes (sub classes share ENCODER_BY_TYPE) are renewed
+    encoder_version = 0
 
-    def default(self, o):
-        if isinstance(o, Enum):
-            return o.value
-        for k, v in self.ENCODER_BY_TYPE.items():
-            if isinstance(o, k):
-                encoder = v
-                return encoder(o)
-
-        if type(o) == "pydantic.main.BaseModel":
-            return o.dict()
-
+    @staticmethod
+    def encode_object(o):
+        """Default encoder of types are not in ENCODER_BY_TYPE"""
         try:
-            return super().default(o)
-        except TypeError:
-            try:
-                return o.__dict__
-            except AttributeError:
-                return str(o)
+            return o.__dict__
+        except AttributeError:
+            return str(o)
+
+    @classmethod
+    def register_type(cls, type_, encoder):
+        """Register encoder of custom type (and its sub types)
+
+        Args:
+            type_ (type): Example: decimal.Decimal
+            encoder (function): Example: float
+        """
+        if "ENCODER_BY_TYPE" not in cls.__dict__:
+            cls.ENCODER_BY_TYPE = dict(cls.ENCODER_BY_TYPE)
+        cls.ENCODER_BY_TYPE[type_] = encoder
+        UniversalEncoder.encoder_version += 1
+
+    @classmethod
+    def get_encoder(cls, type_):
+        """Get encoder of type, the nearest type in MRO of type_ which is in ENCODER_BY_TYPE is used.
+        Result is cached by type
+        """
+        cache = cls.__dict__.get("encoder_cache")
+        if cache is None or cls.__dict__.get("encoder_cache_version") != UniversalEncoder.encoder_version:
+            cache = cls.encoder_cache = {}
+            cls.encoder_cache_version = UniversalEncoder.encoder_version
+        encoder = cache.get(type_)
+        if encoder is None:
+            encoder = cls.encode_object
+            for base in type_.__mro__:
+                if base in cls.ENCODER_BY_TYPE:
+                    encoder = cls.ENCODER_BY_TYPE[base]
+                    break
+            cache[type_] = encoder
+        return encoder
+
+    def default(self, o):
+        return self.get_encoder(type(o))(o)
 
 
-def write_dict_to_json_file(file_path: Union[Path, str], data, encoding="utf-8", newline="\n", indent=2):
-    """Write dict data to text file with json format
+def write_dict_to_json_file(file_path: Union[Path, str], data, encoding="utf-8", newline="\n", indent=2, b_fast=False, compresslevel: int = None, compress_workers=1):
+    """Write dict data to text file with json format, file is compressed if its suffix is .gz, .bz2, .xz, .lzma
 
     Args:
         file_path (str): dest file path
         data (dict): dictionary data
         encoding (str):
+        b_fast (bool, optional): Use orjson if it is installed (utf-8 and indent=2 only). Data is same as json module,
+            floats may be written in shorter form (1e16 instead of 1e+16), NaN and Infinity are written as null. Defaults to False.
+        compresslevel (int, optional): Level of gzip / bz2 (1-9), preset of xz / lzma (0-9). Defaults to None (default of codec).
+        compress_workers (int, optional): Number of threads compress gzip file. Defaults to 1.
     """
     file_path = __convert_path(file_path, b_create_parent=True)
 
-    with open(file_path, "w+", encoding=encoding, newline=newline) as f_dest:
+    if b_fast and indent == 2 and codecs.lookup(encoding).name == "utf-8":
+        try:
+            import orjson
+        except ImportError:
+            orjson = None
+        if orjson is not None:
+            encoder = UniversalEncoder()
+
+            def default(o):
+                # Sub types of tuple (namedtuple) are lists in json module
+                if isinstance(o, tuple):
+                    return list(o)
+                return encoder.default(o)
+            try:
+                s = orjson.dumps(data, default=default,
+                                 option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS)
+            except TypeError:
+                # Not supported by orjson (Ex: integer > 64 bits), use json module
+                s = None
+            if s is not None:
+                newline = os.linesep if newline is None else newline
+                if newline and newline != "\n":
+                    s = s.replace(b"\n", newline.encode())
+                with open_file(file_path, "wb", compresslevel=compresslevel, compress_workers=compress_workers) as f_dest:
+                    f_dest.write(s)
+                return
+
+    with open_file(file_path, "w+", encoding=encoding, newline=newline, compresslevel=compresslevel, compress_workers=compress_workers) as f_dest:
         # Save direct to text file
         json.dump(data, f_dest, ensure_ascii=False, indent=indent, cls=UniversalEncoder)
 
 
-def write_dict_to_json_file_simple(file_path: Union[Path, str], data, encoding="utf-8", indent=0):
-    """Write dict data to text file with no format
+def write_dict_to_json_file_simple(file_path: Union[Path, str], data, encoding="utf-8", indent=0, compresslevel: int = None, compress_workers=1):
+    """Write dict data to text file with no format, file is compressed if its suffix is .gz, .bz2, .xz, .lzma
 
     Args:
         file_path (str): dest file path
         data (dict): dictionary data
         encoding (str):
+        compresslevel (int, optional): Level of gzip / bz2 (1-9), preset of xz / lzma (0-9). Defaults to None (default of codec).
+        compress_workers (int, optional): Number of threads compress gzip file. Defaults to 1.
     """
     file_path = __convert_path(file_path, b_create_parent=True)
 
-    with open(file_path, "w+", encoding=encoding) as f_dest:
+    with open_file(file_path, "w+", encoding=encoding, compresslevel=compresslevel, compress_workers=compress_workers) as f_dest:
         # Save direct to text file
         if indent < 0:
             json.dump(data, f_dest, ensure_ascii=False)
@@ -554,6 +1730,136 @@ def write_dict_to_json_file_simple(file_path: Union[Path, str], data, encoding="
             json.dump(data, f_dest, ensure_ascii=False, indent=indent)
 
 
+def iter_jsonl(file_path: Union[Path, str], encoding="utf-8", b_ignore_error=False) -> Iterator:
+    """Iterate records of JSON Lines file (1 json per line) without loading whole file
+
+    Args:
+        file_path (Path | str): source file
+        encoding (str):
+        b_ignore_error (bool, optional): Skip invalid lines (Ex: last line is written partly). Defaults to False.
+
+    Returns:
+        Iterator: records
+    """
+    for line in iter_file_lines(file_path, b_remove_blank_str=True, encoding=encoding, errors="strict"):
+        try:
+            yield json.loads(line)
+        except ValueError:
+            if not b_ignore_error:
+                raise
+
+
+def append_jsonl(file_path: Union[Path, str], records, encoding="utf-8", lock=None, compresslevel: int = None):
+    """Append records to end of JSON Lines file (1 json per line), all records are written by 1 write call
+
+    Args:
+        file_path (Path | str): dest file
+        records (Iterable | dict): records, dict is 1 record
+        encoding (str):
+        lock: using when running thread
+        compresslevel (int, optional): Level of gzip / bz2 (1-9), preset of xz / lzma (0-9) of compressed file. Defaults to None (default of codec).
+    """
+    file_path = __convert_path(file_path, b_create_parent=True)
+    if isinstance(records, dict):
+        records = [records]
+    encoder = UniversalEncoder(ensure_ascii=False)
+    data = "".join(encoder.encode(_) + "\n" for _ in records)
+    if not data:
+        return
+
+    if lock:
+        lock.acquire()
+    try:
+        with open_file(file_path, "a", encoding=encoding, newline="\n", compresslevel=compresslevel) as f_dest:
+            f_dest.write(data)
+    finally:
+        if lock:
+            lock.release()
+
+
+class JsonlWriter(object):
+    """Write records to JSON Lines file (1 json per line) with a buffer, thread safe
+
+    Using
+        with JsonlWriter(file_path) as writer:
+            writer.write({'a': 1})
+    """
+
+    def __init__(self, file_path: Union[Path, str], encoding="utf-8", b_append=True, buffer_size=1 << 20, lock=None, compresslevel: int = None):
+        """
+        Args:
+            file_path (Path | str): dest file
+            encoding (str):
+            b_append (bool, optional): False: truncate existing file. Defaults to True.
+            buffer_size (int, optional): Flush to file when buffer has more than buffer_size characters. Defaults to 1 MiB.
+            lock (optional): lock is shared with other writers of file_path (Ex: append_jsonl)
+            compresslevel (int, optional): Level of gzip / bz2 (1-9), preset of xz / lzma (0-9) of compressed file. Defaults to None (default of codec).
+        """
+        if not file_path:
+            raise ValueError("file_path is not None or empty")
+        self.file_path = Path(file_path)
+        self.file_path.parent.mkdir(exist_ok=True, parents=True)
+        self.buffer_size = buffer_size
+        self.file_lock = lock
+        self.lock = threading.Lock()
+        self.encoder = UniversalEncoder(ensure_ascii=False)
+        self.buffer = []
+        self.buffer_len = 0
+        self.f_dest = open_file(self.file_path, "a" if b_append else "w", encoding=encoding, newline="\n", compresslevel=compresslevel)
+
+    def write(self, record):
+        """Add 1 record to buffer"""
+        line = self.encoder.encode(record) + "\n"
+        with self.lock:
+            self.buffer.append(line)
+            self.buffer_len += len(line)
+            if self.buffer_len >= self.buffer_size:
+                self.__flush()
+
+    def write_many(self, records):
+        """Add records to buffer"""
+        lines = [self.encoder.encode(_) + "\n" for _ in records]
+        with self.lock:
+            self.buffer.extend(lines)
+            self.buffer_len += sum(len(_) for _ in lines)
+            if self.buffer_len >= self.buffer_size:
+                self.__flush()
+
+    def __flush(self):
+        if not self.buffer:
+            return
+        data = "".join(self.buffer)
+        self.buffer = []
+        self.buffer_len = 0
+        if self.file_lock:
+            self.file_lock.acquire()
+        try:
+            self.f_dest.write(data)
+            self.f_dest.flush()
+        finally:
+            if self.file_lock:
+                self.file_lock.release()
+
+    def flush(self):
+        """Write buffer to file"""
+        with self.lock:
+            self.__flush()
+
+    def close(self):
+        """Flush buffer and close file"""
+        with self.lock:
+            if self.f_dest.closed:
+                return
+            self.__flush()
+            self.f_dest.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
 def get_current_dir(path: Union[Path, str]) -> Path:
     """Get current dir of path
 
@@ -566,49 +1872,84 @@ def get_current_dir(path: Union[Path, str]) -> Path:
     return __convert_path(path).parent.resolve()
 
 
-def find_empty_folder(folder: Union[Path, str], b_add_self=False) -> List[str]:
-    """Find empty folder
+def __remove_empty_folder(folder: Path, b_add_self=False, b_remove=True, workers=1):
+    """Scan folder once, then remove empty folders from bottom (children before parent)
+
+    Returns:
+        Tuple[int, List[str]]: (number of scanned folders, empty folders)
+    """
+    folder = __convert_path(folder, b_check_exists=True)
+    root = str(folder)
+    nodes = []
+    for cur_folder, _, depth, files, folders in __walk_folder(folder, level=-1, workers=workers):
+        # Symlink folders are not removed
+        content = len(files) + sum(1 for f in folders if f.is_symlink())
+        nodes.append((depth, cur_folder, content, [f.path for f in folders if not f.is_symlink()]))
+
+    ret = []
+    empty = set()
+    for depth, cur_folder, content, children in sorted(nodes, key=lambda x: x[0], reverse=True):
+        if content or not all(_ in empty for _ in children):
+            continue
+        if cur_folder == root and not b_add_self:
+            continue
+        if b_remove:
+            try:
+                os.rmdir(cur_folder)
+            except OSError:
+                # Folder has other items (Ex: broken symlink) or it can not be removed
+                continue
+        empty.add(cur_folder)
+        ret.append(cur_folder)
+    return len(nodes), ret
+
+
+def find_empty_folder(folder: Union[Path, str], b_add_self=False, workers=1) -> List[str]:
+    """Find empty folder, folders contain only empty folders are empty also
 
     Args:
         folder (str): folder
         b_add_self (bool, optional): Default to False,  if True current folder will be add to return list if it is empty
+        workers (int, optional): Number of threads scan sub folders in parallel. Defaults to 1.
 
     Return:
-        list: list of empty folder
+        list: list of empty folder, children are before parent
     """
-    files = list_files(folder=folder, level=0)
-    folders = list_sub_folders(folder=folder, level=0)
-    ret = []
-    if not files and not folders and b_add_self:
-        ret = [str(folder)]
+    return __remove_empty_folder(folder, b_add_self=b_add_self, b_remove=False, workers=workers)[1]
 
-    for _ in folders:
-        ret.extend(find_empty_folder(_, b_add_self=True))
-
-    return ret
 
-
-def remove_empty_folder(folder: Union[Path, str], b_add_self=False):
-    """Remove empty folder
+def remove_empty_folder(folder: Union[Path, str], b_add_self=False, dry_run=False, workers=1) -> Dict[str, int]:
+    """Remove empty folder, folder is removed when all its children are removed (folder tree is scanned only 1 time)
 
     Args:
         folder (Union[Path, str]): _description_
         b_add_self (bool, optional): Default to False, if True current folder will be remove if it is empty
+        dry_run (bool, optional): Only count folders will be removed. Defaults to False.
+        workers (int, optional): Number of threads scan sub folders in parallel. Defaults to 1.
+
+    Returns:
+        Dict[str, int]: {'scanned': number of scanned folders, 'removed': number of removed folders}
     """
-    list_dir = find_empty_folder(folder, b_add_self)
-    while list_dir:
-        for _ in list_dir:
-            os.rmdir(_)
-        list_dir = find_empty_folder(folder, b_add_self)
+    scanned, removed = __remove_empty_folder(folder, b_add_self=b_add_self, b_remove=not dry_run, workers=workers)
+    return {'scanned': scanned, 'removed': len(removed)}
 
 
-def start_logging(file_path: Union[Path, str], renew=False, level=logging.INFO, b_terminal=True):
+# Listener of start_logging(b_async=True)
+__LOG_LISTENER = None
+
+
+def start_logging(file_path: Union[Path, str], renew=False, level=logging.INFO, b_terminal=True, b_async=False, flush_interval=1.0):
     """Start loging process, create file log based on py file_path or file_path if file_path isn't python file
 
     Args:
         renew (bool, optional):
             True: delete current log file and create new log file
+        b_async (bool, optional): Logging calls only put records to a queue, a background thread writes them to file/terminal.
+            Call stop_logging() to write all records (it is called at exit). Defaults to False.
+        flush_interval (float, optional): Only with b_async, flush log file after flush_interval seconds, also when no records come
+            (records >= ERROR are flushed immediately). Defaults to 1.0.
     """
+    global __LOG_LISTENER
     file_path = __convert_path(file_path, b_create_parent=True)
     file_name = file_path.name
     if file_path.suffix == ".py":
@@ -619,7 +1960,41 @@ def start_logging(file_path: Union[Path, str], renew=False, level=logging.INFO,
     if renew and file_path.exists():
         os.remove(file_path)
     formatter = "%(asctime)s %(levelname)s: %(name)s->%(funcName)s - %(message)s"
-    handlers = [logging.FileHandler(file_path, "w+" if renew else "a+", "utf-8")]
+    datefmt = "%Y-%m-%d %H:%M:%S"
+
+    class BufferedFileHandler(logging.FileHandler):
+        """Flush file after flush_interval seconds instead of after each record (close() flushes file)"""
+        last_flush = 0.0
+
+        def emit(self, record):
+            if self.stream is None:
+                self.stream = self._open()
+            try:
+                self.stream.write(self.format(record) + self.terminator)
+                if record.levelno >= logging.ERROR or time.monotonic() - self.last_flush >= flush_interval:
+                    self.flush()
+            except Exception:
+                self.handleError(record)
+
+        def flush(self):
+            super().flush()
+            self.last_flush = time.monotonic()
+
+    class FlushQueueListener(logging.handlers.QueueListener):
+        """Flush handlers when no records come for flush_interval seconds, last records are not kept in buffer"""
+
+        def dequeue(self, block):
+            while True:
+                try:
+                    return self.queue.get(block, timeout=flush_interval)
+                except queue.Empty:
+                    if not block:
+                        raise
+                    for _ in self.handlers:
+                        _.flush()
+
+    file_handler_class = BufferedFileHandler if b_async else logging.FileHandler
+    handlers = [file_handler_class(file_path, "w+" if renew else "a+", "utf-8")]
     if b_terminal:
         from colorama import Fore, Back, Style
         colors = {
@@ -640,56 +2015,210 @@ def start_logging(file_path: Union[Path, str], renew=False, level=logging.INFO,
         s_handler.setFormatter(ColoredFormatter(formatter))
         handlers.append(s_handler)
 
-    logging.basicConfig(
-        level=level,  # minimum level capture in the file
-        format=formatter,
-        datefmt="%Y-%m-%d %H:%M:%S",
-        handlers=handlers,
-    )
+    if b_async:
+        handlers[0].setFormatter(logging.Formatter(formatter, datefmt=datefmt))
+        log_queue = queue.Queue()
+        q_handler = logging.handlers.QueueHandler(log_queue)
+        # Message (and traceback) is formatted in caller thread, full format is made by handlers of listener
+        q_handler.setFormatter(logging.Formatter("%(message)s"))
+        logging.basicConfig(level=level, handlers=[q_handler])
+        if q_handler not in logging.root.handlers:
+            # Logging was started already
+            for _ in handlers:
+                _.close()
+        else:
+            stop_logging()
+            __LOG_LISTENER = FlushQueueListener(log_queue, *handlers, respect_handler_level=True)
+            __LOG_LISTENER.start()
+            atexit.register(stop_logging)
+    else:
+        logging.basicConfig(
+            level=level,  # minimum level capture in the file
+            format=formatter,
+            datefmt=datefmt,
+            handlers=handlers,
+        )
     logging.info(
         f"--------------------------------------------- {file_name} - {dt.datetime.now()} ---------------------------------------------------"
     )
 
 
-def process_files_in_folder(*args, folder: Union[Path, str] = None, func=None, pattern: str = '*', level=0):
+def stop_logging():
+    """Stop background thread of start_logging(b_async=True), all queued records are written and flushed"""
+    global __LOG_LISTENER
+    listener = __LOG_LISTENER
+    if listener is None:
+        return
+    __LOG_LISTENER = None
+    listener.stop()
+    for _ in listener.handlers:
+        _.flush()
+
+
+def __process_files(*args, files=None, func=None, b_order=False, executor: str = None, executor_workers=4, queue_size=1000, b_result=False, progress_interval: float = None):
+    """Process files of process_files_in_folder"""
+    results = [] if b_result else None
+    start_time = last_log_time = time.monotonic()
+    done = 0
+
+    def log_progress(pending=0, b_force=False):
+        nonlocal last_log_time
+        now = time.monotonic()
+        if progress_interval is None or (not b_force and now - last_log_time < progress_interval):
+            return
+        last_log_time = now
+        logging.info(f"process_files_in_folder: {done} files, {done / max(now - start_time, 1e-6):.1f} files/s, queue {pending}")
+
+    if executor is None:
+        for _ in files:
+            ret = func(_, *args)
+            if b_result:
+                results.append(ret)
+            done += 1
+            log_progress()
+        log_progress(b_force=True)
+        return results
+
+    pool = ThreadPoolExecutor(max_workers=executor_workers) if executor == 'thread' else ProcessPoolExecutor(max_workers=executor_workers)
+    pending = collections.deque()
+
+    def collect(job):
+        nonlocal done
+        ret = job.result()
+        if b_result:
+            results.append(ret)
+        done += 1
+
+    try:
+        for file_path in files:
+            if len(pending) >= queue_size:
+                if b_order:
+                    collect(pending.popleft())
+                else:
+                    finished = wait(pending, return_when=FIRST_COMPLETED).done
+                    pending = collections.deque(job for job in pending if job not in finished)
+                    for job in finished:
+                        collect(job)
+                log_progress(len(pending))
+            pending.append(pool.submit(func, file_path, *args))
+
+        if b_order:
+            while pending:
+                collect(pending.popleft())
+                log_progress(len(pending))
+        else:
+            for job in as_completed(pending):
+                collect(job)
+                log_progress()
+        log_progress(b_force=True)
+    finally:
+        for _ in pending:
+            _.cancel()
+        pool.shutdown(wait=True)
+    return results
+
+
+def process_files_in_folder(*args, folder: Union[Path, str] = None, func=None, pattern: str = '*', level=0, exclude_names: List[str] = None, workers=1, b_order=False, index_file: Union[Path, str] = None,
+                            executor: str = None, executor_workers=4, queue_size=1000, b_result=False, progress_interval: float = None):
     """
 
     Args:
         func : Must be func_name(file_path, *args)
+        exclude_names (List[str], optional): ['*a.html', '???']. Defaults to None.
+        workers (int, optional): Number of threads scan sub folders in parallel. Defaults to 1.
+        b_order (bool, optional): Keep same order as workers=1 when workers > 1, results are in same order of files. Defaults to False.
+        index_file (Path | str, optional): sqlite index file (see update_folder_index).
+            If set, only files added or modified since the last call are processed,
+            index is saved after all files are processed (files are processed again by next call if func raises). Defaults to None.
+        executor (str, optional): 'thread' or 'process': files are processed by a pool while folder is being scanned.
+            Defaults to None (files are processed one by one).
+        executor_workers (int, optional): Number of threads/processes of executor. Defaults to 4.
+        queue_size (int, optional): Max number of files are waiting in executor, scanning waits when queue is full. Defaults to 1000.
+        b_result (bool, optional): Return list of results of func. Defaults to False.
+        progress_interval (float, optional): Log progress (files/s, queue depth) every progress_interval seconds. Defaults to None.
+
+    Returns:
+        list | None: results of func if b_result
     """
     folder = __convert_path(folder, b_check_exists=True)
     if not func:
         raise ValueError("Invalid parameter 'func'")
+    if executor not in (None, 'thread', 'process'):
+        raise ValueError("executor must be None, 'thread' or 'process'")
 
-    files = list_files(folder, pattern, level)
+    if index_file:
+        folder, level = __check_list_params(folder, pattern, level)
+        pattern_re = __compile_pattern(pattern)
+        ret = []
 
-    for _ in files:
-        func(_, *args)
+        def process_diff(diff):
+            ret.append(__process_files(*args, files=(_ for _ in diff['added'] + diff['modified']
+                                                     if (level == -1 or len(_.relative_to(folder).parts) - 1 <= level) and (pattern_re is None or pattern_re.match(_.name))),
+                                       func=func, b_order=b_order, executor=executor, executor_workers=executor_workers, queue_size=queue_size, b_result=b_result,
+                                       progress_interval=progress_interval))
 
+        # Index is saved after files are processed
+        update_folder_index(folder, index_file, exclude_names=exclude_names, callback=process_diff)
+        return ret[0]
 
-def is_binary_file(file_path: Union[Path, str]):
-    """Return true if the given filename is binary.
+    # files are processed while folder is being scanned
+    files = iter_files(folder, pattern, level, exclude_names=exclude_names, workers=workers, b_order=b_order)
+    return __process_files(*args, files=files, func=func, b_order=b_order, executor=executor, executor_workers=executor_workers, queue_size=queue_size, b_result=b_result,
+                           progress_interval=progress_interval)
+
+
+def is_binary_file(file_path: Union[Path, str], sniff_bytes: int = None):
+    """Return true if the given filename is binary (contains null byte).
+
+    Args:
+        sniff_bytes (int, optional): Only check first sniff_bytes bytes. Defaults to None (whole file).
 
     Raises an EnvironmentError if the file does not exist or cannot be
     accessed.
     """
     file_path = __convert_path(file_path, b_check_exists=True)
 
-    fin = open(file_path, "rb")
-    ret = False
-    try:
-        CHUNK_SIZE = 1024
-        while 1:
-            chunk = fin.read(CHUNK_SIZE)
-            if 0 in chunk:  # found null byte
-                ret = True
+    with open(file_path, "rb") as fin:
+        if sniff_bytes is not None and sniff_bytes <= mmap.ALLOCATIONGRANULARITY:
+            return b"\0" in fin.read(sniff_bytes)
+
+        mm = __mmap_file(fin)
+        if mm is not None:
+            with mm:
+                end = len(mm) if sniff_bytes is None else min(sniff_bytes, len(mm))
+                return mm.find(b"\0", 0, end) != -1
+
+        # Special files (size is 0) can not be mapped
+        CHUNK_SIZE = 1 << 20
+        remain = -1 if sniff_bytes is None else sniff_bytes
+        while remain != 0:
+            chunk = fin.read(CHUNK_SIZE if remain < 0 else min(CHUNK_SIZE, remain))
+            if not chunk:
                 break
-            if len(chunk) < CHUNK_SIZE:
-                break  # done
-    finally:
-        fin.close()
+            if b"\0" in chunk:
+                return True
+            if remain > 0:
+                remain -= len(chunk)
+    return False
 
-    return ret
+
+def classify_files(paths: List[Union[Path, str]], sniff_bytes: int = None, workers=8) -> Dict[Path, bool]:
+    """Check many files are binary or not by thread pool
+
+    Args:
+        paths (List[Path | str]): files
+        sniff_bytes (int, optional): Only check first sniff_bytes bytes of each file. Defaults to None (whole file).
+        workers (int, optional): Number of threads. Defaults to 8.
+
+    Returns:
+        Dict[Path, bool]: {file: True if file is binary}
+    """
+    paths = [__convert_path(_) for _ in paths]
+    if workers <= 1 or len(paths) <= 1:
+        return {_: is_binary_file(_, sniff_bytes=sniff_bytes) for _ in paths}
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        return dict(zip(paths, executor.map(lambda x: is_binary_file(x, sniff_bytes=sniff_bytes), paths)))
 
 
 def move_items_in_folder(source_folder: Union[Path, str], dest_folder: Union[Path, str]):
@@ -715,51 +2244,277 @@ def move_items_in_folder(source_folder: Union[Path, str], dest_folder: Union[Pat
         shutil.move(os.path.join(source_folder, _), os.path.join(dest_folder, _))
 
 
-def re_create_new_filename(file_path: Union[Path, str], sep='-') -> Path:
-    """Recreate new file name if it exists
+# Next suffix number to try of (folder, stem, sep, suffix), used by re_create_new_filename
+__FILENAME_COUNTERS = {}
+__FILENAME_COUNTERS_LOCK = threading.Lock()
+
+
+def __reserve_file(file_path: Path) -> bool:
+    """Create empty file if it does not exist (atomic)
+
+    Returns:
+        bool: True if file is created
+    """
+    try:
+        fd = os.open(file_path, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+    except FileExistsError:
+        return False
+    os.close(fd)
+    return True
+
+
+def re_create_new_filename(file_path: Union[Path, str], sep='-', b_reserve=False) -> Path:
+    """Recreate new file name if it exists: name{sep}1.ext, name{sep}2.ext...
+    Folder is scanned 1 time to find largest used number, next number is cached
 
     Args:
         file_path (str | Path): [description]
+        sep (str, optional): Defaults to '-'.
+        b_reserve (bool, optional): Create empty file of new file name (atomic, O_CREAT | O_EXCL),
+            threads/processes never get same file name, folder is created. Defaults to False.
 
     Returns:
         str: generate new file name if file_name exists
     """
     file_path = __convert_path(file_path)
 
-    if not file_path.exists():
+    if b_reserve:
+        file_path.parent.mkdir(parents=True, exist_ok=True)
+        if __reserve_file(file_path):
+            return file_path
+    elif not file_path.exists():
         return file_path
 
     name = file_path.stem
-    n = 1
-    new_file_path = file_path.with_name(f"{name}{sep}{n}").with_suffix(file_path.suffix)
-    while new_file_path.exists():
+    suffix = file_path.suffix
+    folder = file_path.parent
+    key = (str(folder.absolute()), name, sep, suffix)
+    with __FILENAME_COUNTERS_LOCK:
+        n = __FILENAME_COUNTERS.get(key)
+    if n is None:
+        n = 1
+        name_re = re.compile(re.escape(name + sep) + r"(\d+)" + re.escape(suffix))
+        try:
+            with os.scandir(folder) as it:
+                for entry in it:
+                    m = name_re.fullmatch(entry.name)
+                    if m:
+                        n = max(n, int(m.group(1)) + 1)
+        except FileNotFoundError:
+            pass
+
+    while True:
+        new_file_path = folder / f"{name}{sep}{n}{suffix}"
+        if b_reserve:
+            if __reserve_file(new_file_path):
+                break
+        elif not new_file_path.exists():
+            break
         n += 1
-        new_file_path = file_path.with_name(f"{name}{sep}{n}").with_suffix(file_path.suffix)
 
+    with __FILENAME_COUNTERS_LOCK:
+        if len(__FILENAME_COUNTERS) > 10000:
+            __FILENAME_COUNTERS.clear()
+        # Reserved number is used, other numbers may be used by caller later
+        next_n = n + 1 if b_reserve else n
+        __FILENAME_COUNTERS[key] = max(next_n, __FILENAME_COUNTERS.get(key, 0))
     return new_file_path
 
 
-def count_files(folder: Union[Path, str], file_type=None) -> int:
+def folder_stats(folder: Union[Path, str], pattern: str = '*', level=-1, exclude_names: List[str] = None, is_exclude_names_case=True, workers=1, top_k=10, b_size=True, index_file: Union[Path, str] = None) -> dict:
+    """Statistics of files in folder, folder is scanned 1 time
+
+    Args:
+        folder (Path | str)
+        pattern (str, optional): Defaults to '*'.
+        level:
+            -1: no limit
+            0: current folder
+        exclude_names (List[str], optional): ['*a.html', '???']. Defaults to None.
+        is_exclude_names_case (bool, optional): Case sensitive on match exclude names. Defaults to True.
+        workers (int, optional): Number of threads scan sub folders in parallel. Defaults to 1.
+        top_k (int, optional): Number of largest files. Defaults to 10.
+        b_size (bool, optional): False: only count files, do not stat files. Defaults to True.
+        index_file (Path | str, optional): sqlite index file (see update_folder_index), only changed folders are scanned. Defaults to None.
+
+    Returns:
+        dict: {
+            'files': number of files,
+            'folders': number of scanned folders,
+            'bytes': total size,
+            'extensions': {'.txt': {'files': 10, 'bytes': 1000}, ...} (extension is lower case),
+            'largest': [(size, Path), ...] (top_k largest files, largest first),
+            'newest_mtime': mtime of newest file or None,
+        }
+    """
+    folder, level = __check_list_params(folder, pattern, level)
+    pattern_re = __compile_pattern(pattern)
+    ret = {'files': 0, 'folders': 0, 'bytes': 0, 'extensions': {}, 'largest': [], 'newest_mtime': None}
+    extensions = ret['extensions']
+    largest = []
+
+    def add(name, file_path, size, mtime):
+        ret['files'] += 1
+        ext = os.path.splitext(name)[1].lower()
+        if ext not in extensions:
+            extensions[ext] = {'files': 0, 'bytes': 0}
+        extensions[ext]['files'] += 1
+        if not b_size:
+            return
+        extensions[ext]['bytes'] += size
+        ret['bytes'] += size
+        if ret['newest_mtime'] is None or mtime > ret['newest_mtime']:
+            ret['newest_mtime'] = mtime
+        if top_k > 0:
+            if len(largest) < top_k:
+                heapq.heappush(largest, (size, file_path))
+            elif size > largest[0][0]:
+                heapq.heappushpop(largest, (size, file_path))
+
+    if index_file:
+        update_folder_index(folder, index_file, exclude_names=exclude_names, is_exclude_names_case=is_exclude_names_case, b_check_modified=b_size)
+        con = sqlite3.connect(str(index_file))
+        try:
+            folders = set()
+            for rel_folder, name, size, mtime_ns in con.execute("SELECT folder, name, size, mtime_ns FROM files"):
+                depth = rel_folder.count(os.sep) + 1 if rel_folder else 0
+                if level != -1 and depth > level:
+                    continue
+                folders.add(rel_folder)
+                if pattern_re is None or pattern_re.match(name):
+                    add(name, os.path.join(str(folder), rel_folder, name), size, mtime_ns / 1e9)
+            ret['folders'] = con.execute("SELECT COUNT(*) FROM folders").fetchone()[0] if level == -1 else len(folders)
+        finally:
+            con.close()
+    else:
+        exclude_re = __compile_names(exclude_names, is_exclude_names_case)
+        for _, _, _, files, _ in __walk_folder(folder, level=level, exclude_re=exclude_re, workers=workers):
+            ret['folders'] += 1
+            for entry in files:
+                if pattern_re is not None and not pattern_re.match(entry.name):
+                    continue
+                if b_size:
+                    try:
+                        st = entry.stat()
+                    except OSError:
+                        continue
+                    add(entry.name, entry.path, st.st_size, st.st_mtime)
+                else:
+                    add(entry.name, entry.path, 0, 0)
+
+    ret['largest'] = [(size, Path(file_path)) for size, file_path in sorted(largest, reverse=True)]
+    return ret
+
+
+def count_files(folder: Union[Path, str], file_type=None, level=0, workers=1) -> int:
     """
     count files in one folders
+
+    Args:
+        file_type (str, optional): Count files whose name ends with file_type. Defaults to None.
+        level (int, optional): -1: no limit, 0: current folder. Defaults to 0.
+        workers (int, optional): Number of threads scan sub folders in parallel. Defaults to 1.
     """
-    folder = __convert_path(folder, b_check_exists=True)
-    gen_file = folder.iterdir()
-    b_end = False
-    count = 0
-    while not b_end:
+    pattern = '*' if file_type is None else '*' + glob.escape(file_type)
+    return folder_stats(folder, pattern=pattern, level=level, workers=workers, b_size=False)['files']
+
+
+def hash_file(file_path: Union[Path, str], algorithm="blake2b", chunk_size=1 << 20) -> str:
+    """Hash content of file
+
+    Args:
+        file_path (Path | str)
+        algorithm (str, optional): name of hashlib algorithm. Defaults to "blake2b".
+        chunk_size (int, optional): Defaults to 1 MiB.
+
+    Returns:
+        str: hex digest
+    """
+    h = hashlib.new(algorithm)
+    with open(file_path, "rb") as f_source:
+        while True:
+            buf = f_source.read(chunk_size)
+            if not buf:
+                break
+            h.update(buf)
+    return h.hexdigest()
+
+
+def __copy_file_data(src: str, dest: str):
+    """Copy data of file, use copy_file_range (copy in kernel, reflink or server side copy) if it is supported"""
+    if hasattr(os, "copy_file_range"):
         try:
-            file = next(gen_file)
-            if not file.is_file():
-                continue
-            if file_type is None or (file_type is not None and file.name.endswith(file_type)):
-                count += 1
-        except StopIteration:
-            b_end = True
-    return count
+            with open(src, "rb") as f_source, open(dest, "wb") as f_dest:
+                while os.copy_file_range(f_source.fileno(), f_dest.fileno(), 1 << 30) > 0:
+                    pass
+            return
+        except OSError as ex:
+            if ex.errno not in (errno.EXDEV, errno.ENOSYS, errno.EINVAL, errno.EOPNOTSUPP, errno.EBADF, errno.ETXTBSY):
+                raise
+    # sendfile / fcopyfile are used by shutil if they are supported
+    shutil.copyfile(src, dest)
+
 
+def __copy_file_if_changed(src: str, dest: str, size: int, b_overwrite=True, compare: str = None) -> bool:
+    """Copy file if dest does not exist or it is changed
 
-def copy_folder(src: Union[Path, str], dest: Union[Path, str], b_overwrite: bool = True, ignore_types: List[str] = None, include_types: List[str] = None, ignore_folder: List[str] = None, b_recursive=True):
+    Returns:
+        bool: True if file is copied
+    """
+    try:
+        dest_stat = os.stat(dest)
+    except FileNotFoundError:
+        dest_stat = None
+    if dest_stat is not None:
+        if not b_overwrite:
+            return False
+        if compare and dest_stat.st_size == size:
+            if compare == "mtime" and int(dest_stat.st_mtime) == int(os.stat(src).st_mtime):
+                return False
+            if compare == "hash" and hash_file(src) == hash_file(dest):
+                return False
+
+    __copy_file_data(src, dest)
+    if compare:
+        # Keep mtime for next comparison
+        shutil.copystat(src, dest)
+    else:
+        shutil.copymode(src, dest)
+    return True
+
+
+def __list_copy_items(src: str, ignore_types: List[str] = None, include_types: List[str] = None, ignore_folder: List[str] = None, b_recursive=True):
+    """List folders and files in src which are copied by copy_folder / sync_folder
+
+    Returns:
+        (List[str], Dict[str, os.DirEntry]): relative paths of folders (src is ''), files by relative path
+    """
+    folders = []
+    files = {}
+    stack = ['']
+    while stack:
+        rel_folder = stack.pop()
+        folders.append(rel_folder)
+        with os.scandir(os.path.join(src, rel_folder)) as it:
+            for f in it:
+                rel_path = os.path.join(rel_folder, f.name)
+                if f.is_dir():
+                    if ignore_folder and f.name in ignore_folder:
+                        continue
+                    if not b_recursive:
+                        folders.append(rel_path)
+                    elif not f.is_symlink():
+                        stack.append(rel_path)
+                else:
+                    file_type = os.path.splitext(f.name)[1].lstrip('.')
+                    if ignore_types and file_type in ignore_types:
+                        continue
+                    if (include_types and file_type in include_types) or not include_types:
+                        files[rel_path] = f
+    return folders, files
+
+
+def copy_folder(src: Union[Path, str], dest: Union[Path, str], b_overwrite: bool = True, ignore_types: List[str] = None, include_types: List[str] = None, ignore_folder: List[str] = None, b_recursive=True, compare: str = None, workers=1) -> Dict[str, int]:
     """Copy src/* to dest/*
 
     Args:
@@ -770,32 +2525,326 @@ def copy_folder(src: Union[Path, str], dest: Union[Path, str], b_overwrite: bool
         include_types (list, optional): Include types. Example: ['chm','html']. Defaults to None.
         ignore_folder (list, optional): Ignore folders. Example: folder1. Defaults to None.
         b_recursive (bool, optional): Copy subfolder's contents.. Defaults to True.
+        compare (str, optional): Skip existing files which are unchanged, copied files keep mtime of source files.
+            'mtime': same size and mtime, 'hash': same size and content. Defaults to None (copy all files).
+        workers (int, optional): Number of threads copy files. Defaults to 1.
 
     Raises:
         RuntimeError: _description_
+
+    Returns:
+        Dict[str, int]: {'copied': number of copied files, 'copied_bytes': ..., 'skipped': number of skipped files, 'skipped_bytes': ...}
     """
     src = __convert_path(src, True)
     dest = __convert_path(dest)
+    if compare not in (None, "mtime", "hash"):
+        raise ValueError("compare must be None, 'mtime' or 'hash'")
+    ret = {'copied': 0, 'copied_bytes': 0, 'skipped': 0, 'skipped_bytes': 0}
 
     if src.is_file() or src.is_symlink():
-        return
-    if dest.exists() and dest.is_file():
+        return ret
+
+    # Find files need to be checked
+    folders, files = __list_copy_items(str(src), ignore_types=ignore_types, include_types=include_types, ignore_folder=ignore_folder, b_recursive=b_recursive)
+    for rel_folder in folders:
+        cur_dest = dest / rel_folder
+        if cur_dest.exists() and cur_dest.is_file():
+            raise ValueError(f"{str(cur_dest)} is a file")
+        cur_dest.mkdir(parents=True, exist_ok=True)
+    jobs = [(f.path, str(dest / rel_path), f.stat().st_size) for rel_path, f in files.items()]
+
+    def copy(job):
+        return __copy_file_if_changed(job[0], job[1], job[2], b_overwrite=b_overwrite, compare=compare)
+
+    if workers > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(copy, jobs))
+    else:
+        results = [copy(_) for _ in jobs]
+
+    for job, b_copied in zip(jobs, results):
+        key = 'copied' if b_copied else 'skipped'
+        ret[key] += 1
+        ret[f'{key}_bytes'] += job[2]
+    return ret
+
+
+def diff_folder(src: Union[Path, str], dest: Union[Path, str], delete_extraneous=False, compare="mtime", ignore_types: List[str] = None, include_types: List[str] = None, ignore_folder: List[str] = None,
+                b_recursive=True, workers=1) -> dict:
+    """Compare src with dest and plan changes make dest same as src, data is not changed
+
+    Args:
+        src (Path | str)
+        dest (Path | str)
+        delete_extraneous (bool, optional): Delete files and folders in dest which are not in src, they are used for renamed files. Defaults to False.
+        compare (str, optional): 'mtime': same size and mtime, 'hash': same size and content. Defaults to "mtime".
+        ignore_types, include_types, ignore_folder, b_recursive: same as copy_folder, filtered files in dest are kept
+        workers (int, optional): Number of threads hash files. Defaults to 1.
+
+    Returns:
+        dict: {
+            'new_folders': [Path], 'new': [Path], 'changed': [Path], 'renamed': [(old Path, new Path)], 'deleted': [Path], 'deleted_folders': [Path],
+            'conflicts': [Path], 'unchanged': number of unchanged files, 'bytes': bytes of new and changed files
+        }, paths are relative. conflicts: files in dest are folders in src or folders in dest are files in src, they are removed from dest
+    """
+    src = __convert_path(src, True)
+    dest = __convert_path(dest)
+    if compare not in ("mtime", "hash"):
+        raise ValueError("compare must be 'mtime' or 'hash'")
+    if dest.exists() and not dest.is_dir():
         raise ValueError(f"{str(dest)} is a file")
+
+    src_folders, src_files = __list_copy_items(str(src), ignore_types=ignore_types, include_types=include_types, ignore_folder=ignore_folder, b_recursive=b_recursive)
+    if dest.exists():
+        dest_folders, dest_files = __list_copy_items(str(dest), ignore_types=ignore_types, include_types=include_types, ignore_folder=ignore_folder, b_recursive=b_recursive)
+    else:
+        dest_folders, dest_files = [], {}
+
+    new = [_ for _ in src_files if _ not in dest_files]
+    # Type conflicts, entries in dest (with their contents) are removed: they are not renamed or deleted again
+    conflicts = set()
+    if dest.exists():
+        conflicts.update(_ for _ in set(src_folders) - set(dest_folders) - {''} if os.path.lexists(dest / _) and not (dest / _).is_dir())
+        conflicts.update(_ for _ in new if (dest / _).is_dir())
+
+    def b_conflict(rel_path):
+        while rel_path:
+            if rel_path in conflicts:
+                return True
+            rel_path = os.path.dirname(rel_path)
+        return False
+
+    extraneous = [_ for _ in dest_files if _ not in src_files and not b_conflict(_)] if delete_extraneous else []
+    same_size = []
+    changed = []
+    for rel_path, f in src_files.items():
+        dest_f = dest_files.get(rel_path)
+        if dest_f is None:
+            continue
+        src_stat, dest_stat = f.stat(), dest_f.stat()
+        if src_stat.st_size != dest_stat.st_size:
+            changed.append(rel_path)
+        elif compare == "hash":
+            same_size.append(rel_path)
+        elif int(src_stat.st_mtime) != int(dest_stat.st_mtime):
+            changed.append(rel_path)
+
+    # Hash files have same size, and new / extraneous files have same size for renamed files
+    extraneous_by_size = collections.defaultdict(list)
+    for rel_path in extraneous:
+        extraneous_by_size[dest_files[rel_path].stat().st_size].append(rel_path)
+    rename_candidates = [_ for _ in new if src_files[_].stat().st_size in extraneous_by_size]
+    candidate_sizes = {src_files[_].stat().st_size for _ in rename_candidates}
+    to_hash = [src_files[_].path for _ in same_size + rename_candidates]
+    to_hash += [dest_files[_].path for _ in same_size]
+    to_hash += [dest_files[_].path for size in candidate_sizes for _ in extraneous_by_size[size]]
+    if workers > 1 and len(to_hash) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            hashes = dict(zip(to_hash, executor.map(hash_file, to_hash)))
+    else:
+        hashes = {_: hash_file(_) for _ in to_hash}
+
+    changed += [_ for _ in same_size if hashes[src_files[_].path] != hashes[dest_files[_].path]]
+    renamed = []
+    extraneous_by_hash = {}
+    for size in candidate_sizes:
+        for rel_path in extraneous_by_size[size]:
+            extraneous_by_hash.setdefault((size, hashes[dest_files[rel_path].path]), []).append(rel_path)
+    for rel_path in rename_candidates:
+        old_paths = extraneous_by_hash.get((src_files[rel_path].stat().st_size, hashes[src_files[rel_path].path]))
+        if old_paths:
+            renamed.append((old_paths.pop(), rel_path))
+    renamed_old = {_[0] for _ in renamed}
+    renamed_new = {_[1] for _ in renamed}
+    new = [_ for _ in new if _ not in renamed_new]
+
+    src_folder_set = set(src_folders) - {''}
+    dest_folder_set = set(dest_folders) - {''}
+    return {
+        'new_folders': [Path(_) for _ in sorted(src_folder_set - dest_folder_set)],
+        'new': [Path(_) for _ in sorted(new)],
+        'changed': [Path(_) for _ in sorted(changed)],
+        'renamed': [(Path(old), Path(new)) for old, new in sorted(renamed)],
+        'deleted': [Path(_) for _ in sorted(extraneous) if _ not in renamed_old],
+        'deleted_folders': [Path(_) for _ in sorted(dest_folder_set - src_folder_set) if not b_conflict(_)] if delete_extraneous else [],
+        'conflicts': [Path(_) for _ in sorted(conflicts)],
+        'unchanged': len(src_files) - len(new) - len(renamed) - len(changed),
+        'bytes': sum(src_files[_].stat().st_size for _ in new + changed),
+    }
+
+
+def sync_folder(src: Union[Path, str], dest: Union[Path, str], delete_extraneous=False, compare="mtime", ignore_types: List[str] = None, include_types: List[str] = None, ignore_folder: List[str] = None,
+                b_recursive=True, workers=1, dry_run=False) -> dict:
+    """Make dest same as src (one way): create new folders, rename moved files, copy new and changed files, delete extraneous files and folders.
+    Copied files keep mtime of source files. Files in dest are replaced by folders of src and folders in dest are replaced by files of src.
+
+    Args:
+        src (Path | str)
+        dest (Path | str)
+        delete_extraneous (bool, optional): Delete files and folders in dest which are not in src. Defaults to False.
+        compare (str, optional): 'mtime': same size and mtime, 'hash': same size and content. Defaults to "mtime".
+        ignore_types (list, optional): Ignore types. Example: ['chm','html']. Defaults to None.
+        include_types (list, optional): Include types. Example: ['chm','html']. Defaults to None.
+        ignore_folder (list, optional): Ignore folders. Example: folder1. Defaults to None.
+        b_recursive (bool, optional): Sync subfolder's contents. Defaults to True.
+        workers (int, optional): Number of threads hash and copy files. Defaults to 1.
+        dry_run (bool, optional): Only return plan. Defaults to False.
+
+    Returns:
+        dict: plan of diff_folder
+    """
+    plan = diff_folder(src, dest, delete_extraneous=delete_extraneous, compare=compare, ignore_types=ignore_types, include_types=include_types, ignore_folder=ignore_folder,
+                       b_recursive=b_recursive, workers=workers)
+    if dry_run:
+        return plan
+
+    src = __convert_path(src, True)
+    dest = __convert_path(dest)
     dest.mkdir(parents=True, exist_ok=True)
-    for f in src.glob('*'):
-        if f.is_dir():
-            if ignore_folder and f.name in ignore_folder:
-                continue
-            if b_recursive:
-                copy_folder(f, dest / f.name, b_overwrite=b_overwrite, ignore_types=ignore_types, include_types=include_types, ignore_folder=ignore_folder, b_recursive=b_recursive
-                            )
-            else:
-                (dest / f.name).mkdir(parents=True, exist_ok=True)
+    for rel_path in plan['conflicts']:
+        cur_dest = dest / rel_path
+        if cur_dest.is_dir() and not cur_dest.is_symlink():
+            shutil.rmtree(cur_dest)
         else:
-            file_type = f.suffix.lstrip('.')
-            if ignore_types and file_type in ignore_types:
+            os.remove(cur_dest)
+    for rel_folder in plan['new_folders']:
+        (dest / rel_folder).mkdir(parents=True, exist_ok=True)
+    for old, new in plan['renamed']:
+        os.replace(dest / old, dest / new)
+        # Keep mtime of source file, renamed file is unchanged in next comparison
+        shutil.copystat(src / new, dest / new)
+
+    def copy(rel_path):
+        __copy_file_data(str(src / rel_path), str(dest / rel_path))
+        shutil.copystat(src / rel_path, dest / rel_path)
+
+    jobs = plan['new'] + plan['changed']
+    if workers > 1 and len(jobs) > 1:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(copy, jobs))
+    else:
+        for _ in jobs:
+            copy(_)
+
+    for rel_path in plan['deleted']:
+        os.remove(dest / rel_path)
+    # Sub folders first, folders still have filtered files are kept
+    for rel_folder in sorted(plan['deleted_folders'], key=lambda x: len(x.parts), reverse=True):
+        try:
+            os.rmdir(dest / rel_folder)
+        except OSError:
+            pass
+    return plan
+
+
+def __partial_hash(file_path: str, size: int, partial_size: int, algorithm="blake2b") -> str:
+    """Hash first and last partial_size bytes of file"""
+    h = hashlib.new(algorithm)
+    with open(file_path, "rb") as f_source:
+        h.update(f_source.read(partial_size))
+        if size > partial_size:
+            f_source.seek(max(size - partial_size, partial_size))
+            h.update(f_source.read(partial_size))
+    return h.hexdigest()
+
+
+def find_duplicate_files(folder: Union[Path, str], pattern: str = '*', level=-1, exclude_names: List[str] = None, is_exclude_names_case=True, workers=4,
+                         min_size=1, partial_size=4096, algorithm="blake2b", cache_file: Union[Path, str] = None) -> List[List[Path]]:
+    """Find files have same content:
+        1. group files by size
+        2. hash first and last partial_size bytes of files have same size
+        3. hash full content of files have same size and partial hash
+    Hard links of 1 file are counted as 1 file.
+
+    Args:
+        folder (Path | str)
+        pattern (str, optional): Defaults to '*'.
+        level:
+            -1: no limit
+            0: current folder
+        exclude_names (List[str], optional): ['*a.html', '???']. Defaults to None.
+        is_exclude_names_case (bool, optional): Case sensitive on match exclude names. Defaults to True.
+        workers (int, optional): Number of threads scan folders and hash files. Defaults to 4.
+        min_size (int, optional): Ignore files smaller than min_size bytes. Defaults to 1 (ignore empty files).
+        partial_size (int, optional): Defaults to 4096.
+        algorithm (str, optional): name of hashlib algorithm. Defaults to "blake2b".
+        cache_file (Path | str, optional): sqlite file stores hashes by (device, inode, size, mtime), hashes of unchanged files are not computed again. Defaults to None.
+
+    Returns:
+        List[List[Path]]: groups of duplicate files, largest files first
+    """
+    folder, level = __check_list_params(folder, pattern, level)
+    pattern_re = __compile_pattern(pattern)
+    exclude_re = __compile_names(exclude_names, is_exclude_names_case)
+
+    # 1. group by size
+    by_size = collections.defaultdict(list)
+    inodes = set()
+    for _, _, _, files, _ in __walk_folder(folder, level=level, exclude_re=exclude_re, workers=workers, b_order=True):
+        for entry in files:
+            if pattern_re is not None and not pattern_re.match(entry.name):
+                continue
+            try:
+                st = entry.stat()
+            except OSError:
                 continue
-            if not b_overwrite and (dest / f.name).exists():
+            if st.st_size < min_size or (st.st_ino and (st.st_dev, st.st_ino) in inodes):
                 continue
-            if (include_types and file_type in include_types) or not include_types:
-                shutil.copy(f, dest)
+            inodes.add((st.st_dev, st.st_ino))
+            by_size[st.st_size].append((entry.path, (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)))
+    candidates = [(size, _) for size, items in by_size.items() if len(items) > 1 for _ in items]
+
+    con = None
+    if cache_file:
+        cache_file = __convert_path(cache_file, b_create_parent=True)
+        con = sqlite3.connect(str(cache_file))
+        con.execute("CREATE TABLE IF NOT EXISTS hashes (dev INTEGER, inode INTEGER, size INTEGER, mtime_ns INTEGER, kind TEXT, hash TEXT, PRIMARY KEY (dev, inode, size, mtime_ns, kind))")
+    kind_prefix = f"{algorithm}:{partial_size}:"
+
+    def get_hashes(items, kind, hash_func):
+        """Hash (size, (path, key)) items by thread pool, use cached hashes"""
+        ret = {}
+        todo = []
+        for size, (file_path, key) in items:
+            row = con.execute("SELECT hash FROM hashes WHERE dev=? AND inode=? AND size=? AND mtime_ns=? AND kind=?", (*key, kind_prefix + kind)).fetchone() if con else None
+            if row:
+                ret[file_path] = row[0]
+            else:
+                todo.append((size, file_path, key))
+        with ThreadPoolExecutor(max_workers=max(workers, 1)) as executor:
+            hashes = list(executor.map(lambda x: hash_func(x[1], x[0]), todo))
+        for (size, file_path, key), h in zip(todo, hashes):
+            ret[file_path] = h
+            if con:
+                con.execute("INSERT OR REPLACE INTO hashes VALUES (?, ?, ?, ?, ?, ?)", (*key, kind_prefix + kind, h))
+        return ret
+
+    try:
+        # 2. group by size and partial hash
+        partial = get_hashes(candidates, "partial", lambda file_path, size: __partial_hash(file_path, size, partial_size, algorithm))
+        groups = collections.defaultdict(list)
+        for size, item in candidates:
+            groups[(size, partial[item[0]])].append(item)
+
+        # 3. group by full hash, partial hash is full hash of small files
+        ret = []
+        full_candidates = []
+        for (size, _), items in groups.items():
+            if len(items) < 2:
+                continue
+            if size <= 2 * partial_size:
+                ret.append((size, [Path(_[0]) for _ in items]))
+            else:
+                full_candidates.extend((size, _) for _ in items)
+        full = get_hashes(full_candidates, "full", lambda file_path, size: hash_file(file_path, algorithm=algorithm))
+        groups = collections.defaultdict(list)
+        for size, item in full_candidates:
+            groups[(size, full[item[0]])].append(Path(item[0]))
+        ret.extend((size, items) for (size, _), items in groups.items() if len(items) > 1)
+        if con:
+            con.commit()
+    finally:
+        if con:
+            con.close()
+
+    return [sorted(items) for size, items in sorted(ret, key=lambda x: x[0], reverse=True)]
@@ -3,6 +3,7 @@
 """
 import os
 import subprocess
+import tempfile
 import urllib.parse
 import requests
 from clint.textui import progress
@@ -48,7 +49,11 @@ def download_file(url_: str, file_save: Union[Path, str], b_overwrite=False, b_o
             else:
                 file_save = re_create_new_filename(file_save)
 
-        wget.download(url_, file_save)
+        # wget does not overwrite existing file (or reserved file), it creates file_save (1)
+        # Download to temporary folder (same file system), then replace file_save (reserved file is kept until it is replaced)
+        with tempfile.TemporaryDirectory(dir=os.path.dirname(os.path.abspath(file_save))) as temp_folder:
+            temp_file = wget.download(url_, os.path.join(temp_folder, os.path.basename(file_save)))
+            os.replace(temp_file, file_save)
 
     def download_file_by_curl(url_: str, file_save: str, b_overwrite=False, b_other_name=True, b_chrome=True):
         """Download file from http
@@ -83,36 +88,55 @@ def download_file(url_: str, file_save: Union[Path, str], b_overwrite=False, b_o
                     "User-Agent: Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_3) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/44.0.2403.89 Safari/537.36",
                 ]
             )
-        subprocess.call(cmd)
+        return subprocess.call(cmd)
 
     if file_save and isinstance(file_save, Path):
         file_save = str(file_save)
     # file_save = sanitize_filepath(file_save)
     check_str_blank_throw_exception(url_)
     check_str_blank_throw_exception(file_save)
-    if os.path.exists(file_save) and not b_overwrite:
-        if not b_other_name:
+    b_reserved = False
+    if not b_overwrite:
+        if b_other_name:
+            # Reserve file name (new file name if it exists), other threads do not get it
+            file_save = str(re_create_new_filename(file_save, b_reserve=True))
+            b_overwrite = True
+            b_reserved = True
+        elif os.path.exists(file_save):
             return file_save
+
+    def remove_reserved_file():
+        # Failed download does not keep reserved (empty or partial) file, next retry gets same name
+        if b_reserved:
+            try:
+                os.remove(file_save)
+            except OSError:
+                pass
+
+    b_failed = False
+    try:
+        if type_download == 3:
+            b_failed = download_file_by_curl(url_=url_, file_save=file_save, b_overwrite=b_overwrite, b_other_name=b_other_name) != 0
+        elif type_download == 4:
+            download_file_by_wget(url_=url_, file_save=file_save, b_overwrite=b_overwrite, b_other_name=b_other_name)
+        elif type_download == 1:
+            req = requests.get(url_, stream=True, timeout=timeout, verify=False)
+            with open(file_save, "wb") as f:
+                for chunk in req.iter_content(chunk_size=1024):
+                    if chunk:  # filter out keep-alive new chunks
+                        f.write(chunk)
         else:
-            file_save = re_create_new_filename(file_save)
-
-    if type_download == 3:
-        download_file_by_curl(url_=url_, file_save=file_save, b_overwrite=b_overwrite, b_other_name=b_other_name)
-    elif type_download == 4:
-        download_file_by_wget(url_=url_, file_save=file_save, b_overwrite=b_overwrite, b_other_name=b_other_name)
-    elif type_download == 1:
-        req = requests.get(url_, stream=True, timeout=timeout, verify=False)
-        with open(file_save, "wb") as f:
-            for chunk in req.iter_content(chunk_size=1024):
-                if chunk:  # filter out keep-alive new chunks
-                    f.write(chunk)
-    else:
-        req = requests.get(url_, stream=True, timeout=timeout, verify=False)
-        with open(file_save, "wb") as f:
-            total_length = int(req.headers.get("content-length"))
-            for ch in progress.bar(req.iter_content(chunk_size=2391975), expected_size=(total_length / 1024) + 1):
-                if ch:
-                    f.write(ch)
+            req = requests.get(url_, stream=True, timeout=timeout, verify=False)
+            with open(file_save, "wb") as f:
+                total_length = int(req.headers.get("content-length"))
+                for ch in progress.bar(req.iter_content(chunk_size=2391975), expected_size=(total_length / 1024) + 1):
+                    if ch:
+                        f.write(ch)
+    except BaseException:
+        remove_reserved_file()
+        raise
+    if b_failed:
+        remove_reserved_file()
     return Path(file_save)
 
 
@@ -138,15 +162,11 @@ def download_file_to_folder(url_: str, folder: Union[Path, str], file_name=None,
     file_name = sanitize_filename(file_name)
     file_save = os.path.join(folder, file_name)
 
-    if os.path.exists(file_save) and not b_overwrite:
-        if not b_other_name:
-            return Path(file_save)
-        else:
-            file_save = re_create_new_filename(file_save)
+    # download_file reserves new file name, and removes it if download fails
     file_save = download_file(url_=url_, file_save=file_save, b_overwrite=b_overwrite,
-                              b_other_name=False, type_download=type_download, timeout=timeout)
+                              b_other_name=b_other_name, type_download=type_download, timeout=timeout)
 
-    return file_save
+    return Path(file_save)
 
 
 def get_file_name_from_url(url: str, b_html=False):
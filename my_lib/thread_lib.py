@@ -1,38 +1,65 @@
-import os
+import heapq
+import pickle
+import queue
 import threading
-from typing import List
+import time
+import traceback
+from concurrent.futures import FIRST_EXCEPTION, Future, wait
+from typing import Iterator, List
 from pathlib import Path
 
-def split_array_advance(data: List[dict], item_name: str, part_num: int=2) -> List[dict]:
-    """Split array based on value of item name
+def split_array_advance(data: List, item_name: str = None, part_num: int = 2, key=None, weights=None, b_total=False) -> List[List]:
+    """Split array to parts have nearly same total weight: the heaviest item is added to the part has smallest total
+    (longest processing time first)
 
     Args:
-        data (List[dict]): _description_
-        item_name (str): _description_
-        part_num (int, optional): _description_. Defaults to 2.
+        data (List): items
+        item_name (str, optional): weight of item is item[item_name]. Defaults to None.
+        part_num (int, optional): Number of parts. Defaults to 2.
+        key ([function], optional): weight of item is key(item). Defaults to None (weight of item is item).
+        weights (list | numpy.ndarray, optional): weights of items, they are sorted by numpy if it is installed. Defaults to None.
+        b_total (bool, optional): Defaults to False. Return (parts, total weights of parts)
 
     Returns:
-        List[dict]: _description_
+        List[List]: parts, items of each part are sorted by weight desc
     """
-    if part_num<2:
-        return data
-
-    data = sorted(data, key=lambda x: x[item_name], reverse=True)
-    ret = []
-    arr_value = []
-
-    for _ in range(part_num):
-        ret.append([])
-        arr_value.append(0)
-
-    for val in data:
-        # find array has min value
-        i = arr_value.index(min(arr_value))
-        ret[i].append(val)
-        arr_value[i] += val[item_name]
-
+    if weights is None:
+        if key is None:
+            key = (lambda x: x[item_name]) if item_name is not None else (lambda x: x)
+        weights = [key(_) for _ in data]
+    elif len(weights) != len(data):
+        raise AssertionError("weights and data must have same length")
+
+    if part_num < 2:
+        return (data, [sum(weights)]) if b_total else data
+
+    try:
+        import numpy as np
+    except ImportError:
+        np = None
+    if np is not None and isinstance(weights, np.ndarray):
+        # Stable sort desc, same order as sorted(..., reverse=True)
+        order = np.argsort(-weights.astype(float), kind="stable").tolist()
+        weights = weights.tolist()
+    else:
+        order = sorted(range(len(data)), key=weights.__getitem__, reverse=True)
+
+    ret = [[] for _ in range(part_num)]
+    # (total weight, index of part), part has min total (and min index) is on top
+    heap = [(0, i) for i in range(part_num)]
+    for n in order:
+        total, i = heap[0]
+        ret[i].append(data[n])
+        heapq.heapreplace(heap, (total + weights[n], i))
+
+    if b_total:
+        totals = [0] * part_num
+        for total, i in heap:
+            totals[i] = total
+        return ret, totals
     return ret
 
+
 def split_array(arr:List, num:int=None, size:int=1, b_order = False):
     # sourcery skip: extract-method, remove-unnecessary-else
     """Split array by size
@@ -74,14 +101,113 @@ def split_array(arr:List, num:int=None, size:int=1, b_order = False):
         return [arr[i:i + size] for i in range(0, length, size)]
 
 
+class CostHistory(object):
+    """Measured wall time of items by key, saved to a json file.
+    Items are ordered by predicted cost (longest first), so long items do not start last
+
+    Using
+        history = CostHistory("cost.json", key=lambda item: item['path'])
+        thread_execute(func=func, list_arr=items, cost_history=history)  # history is saved after running
+    """
+
+    def __init__(self, file_path: Path = None, key=None, alpha=0.5):
+        """
+        Args:
+            file_path (Path, optional): json file {key: seconds}. Defaults to None (not saved).
+            key ([function], optional): key of item. Defaults to None (str(item)).
+            alpha (float, optional): Weight of new time, cost = alpha * new time + (1 - alpha) * old cost. Defaults to 0.5.
+        """
+        if not 0 < alpha <= 1:
+            raise AssertionError("alpha must be in (0, 1]")
+        self.file_path = Path(file_path) if file_path else None
+        self.key = key or str
+        self.alpha = alpha
+        self.lock = threading.Lock()
+        self.costs = {}
+        if self.file_path and self.file_path.is_file():
+            from .file_lib import load_json_file
+            try:
+                self.costs = {str(k): float(v) for k, v in load_json_file(self.file_path).items()}
+            except (ValueError, AttributeError, TypeError):
+                # Broken history is rebuilt
+                self.costs = {}
+
+    def predict(self, item) -> float:
+        """Predicted cost (seconds) of item, None if item has no history"""
+        return self.costs.get(str(self.key(item)))
+
+    def record(self, item, seconds: float):
+        """Add measured time of item, thread safe"""
+        k = str(self.key(item))
+        with self.lock:
+            old = self.costs.get(k)
+            self.costs[k] = seconds if old is None else self.alpha * seconds + (1 - self.alpha) * old
+
+    def order(self, items: List) -> List[int]:
+        """Indexes of items by predicted cost, longest first. Items have no history get average cost
+
+        Returns:
+            List[int]: indexes of items
+        """
+        costs = [self.predict(_) for _ in items]
+        known = [_ for _ in costs if _ is not None]
+        if not known:
+            return list(range(len(items)))
+        average = sum(known) / len(known)
+        return sorted(range(len(items)), key=lambda i: average if costs[i] is None else costs[i], reverse=True)
+
+    def save(self):
+        """Write history to file_path"""
+        if not self.file_path:
+            return
+        from .file_lib import write_dict_to_json_file_simple
+        with self.lock:
+            costs = dict(self.costs)
+        write_dict_to_json_file_simple(self.file_path, costs)
+
+
+class ExecuteError(Exception):
+    """Errors of many items of thread_execute / multi_process_execute"""
+
+    def __init__(self, errors: List):
+        """
+        Args:
+            errors (List): [(item, exception)]
+        """
+        self.errors = errors
+        self.item = errors[0][0]
+        super().__init__(f"{len(errors)} items failed, first error: {errors[0][1]!r}")
+
+
+def __attach_item(ex: BaseException, item):
+    """Attach failed item to exception: ex.item"""
+    try:
+        ex.item = item
+    except AttributeError:
+        pass
+    if hasattr(ex, "add_note"):
+        ex.add_note(f"item: {item!r}")
+
+
+def __raise_errors(errors: List):
+    """Raise exception of 1 failed item, or ExecuteError of many items"""
+    if not errors:
+        return
+    if len(errors) == 1:
+        raise errors[0][1]
+    raise ExecuteError(errors) from errors[0][1]
+
+
 class OtherLocalThread(threading.Thread):
     """Thread job"""
 
-    def __init__(self, *args, items=None, func=None, lock=None, output_arr=None, output_index=-1):
+    def __init__(self, *args, items=None, func=None, lock=None, output_arr=None, output_index=-1, cancel_event=None, fail_fast=False):
         """Init
 
         Args:
             file_list (list[dict]): Description
+            cancel_event (threading.Event, optional): stop when it is set
+            fail_fast (bool, optional): set cancel_event when an item fails
         """
         threading.Thread.__init__(self)
         self.func = func
@@ -90,11 +216,17 @@ class OtherLocalThread(threading.Thread):
         self.lock = lock
         self.output_arr = output_arr
         self.output_index = output_index
+        self.cancel_event = cancel_event
+        self.fail_fast = fail_fast
+        # [(item, exception)], thread stops at first error if fail_fast, errors are raised at end of run
+        self.errors = []
 
     def run(self):
         """Running"""
         if self.func and self.items:
             for _ in self.items:
+                if self.cancel_event is not None and self.cancel_event.is_set():
+                    break
                 try:
                     kwarg = {'item': _}
                     if self.lock:
@@ -105,18 +237,209 @@ class OtherLocalThread(threading.Thread):
 
                     self.func(*self.args, **kwarg)
                 except Exception as ex:
-                    raise ex
+                    self.errors.append((_, ex))
+                    if self.fail_fast:
+                        if self.cancel_event is not None:
+                            self.cancel_event.set()
+                        break
+        # Errors are also raised (shown by threading.excepthook) after items are done
+        if len(self.errors) == 1:
+            raise self.errors[0][1]
+        if self.errors:
+            raise ExecuteError(self.errors) from self.errors[0][1]
+
+
+class WorkerPool(object):
+    """Persistent threads pull tasks from a shared queue (a slow task does not block other tasks)
+
+    Using
+        with WorkerPool(thread_num=8) as pool:
+            results = list(pool.map(func, items))  # same order as items
+            future = pool.submit(func, item)
+    """
 
-def thread_execute(*args, thread_num=5, func=None, list_arr=None, b_lock=False, b_split_arr=True, output_arr=None):
-    """Execute by threads
+    # Thread local data of threads of all pools: worker_local.pool is pool of current thread
+    worker_local = threading.local()
+
+    def __init__(self, thread_num=5, name="WorkerPool"):
+        """
+        Args:
+            thread_num (int, optional): Number of threads. Defaults to 5.
+            name (str, optional): Prefix of thread names. Defaults to "WorkerPool".
+        """
+        if thread_num < 1:
+            raise AssertionError("thread_num is < 1")
+        self.thread_num = thread_num
+        self.tasks = queue.SimpleQueue()
+        self.lock = threading.Lock()
+        self.b_shutdown = False
+        self.threads = [threading.Thread(target=self.__run, name=f"{name}-{n}", daemon=True) for n in range(thread_num)]
+        for _ in self.threads:
+            _.start()
+
+    def __run(self):
+        WorkerPool.worker_local.pool = self
+        while True:
+            task = self.tasks.get()
+            if task is None:
+                break
+            future, func, args, kwargs = task
+            if not future.set_running_or_notify_cancel():
+                continue
+            try:
+                result = func(*args, **kwargs)
+            except BaseException as ex:
+                future.set_exception(ex)
+            else:
+                future.set_result(result)
+
+    def is_worker(self) -> bool:
+        """Current thread is a thread of pool"""
+        return getattr(WorkerPool.worker_local, "pool", None) is self
+
+    @staticmethod
+    def in_worker() -> bool:
+        """Current thread is a thread of any pool"""
+        return getattr(WorkerPool.worker_local, "pool", None) is not None
+
+    def submit(self, fn, /, *args, **kwargs) -> Future:
+        """Add task fn(*args, **kwargs) to queue
+
+        Returns:
+            Future: result of task
+        """
+        with self.lock:
+            if self.b_shutdown:
+                raise RuntimeError("WorkerPool is shut down")
+            future = Future()
+            self.tasks.put((future, fn, args, kwargs))
+        return future
+
+    def map(self, fn, items, /, *args, **kwargs) -> Iterator:
+        """Run fn(item, *args, **kwargs) for all items
+
+        Returns:
+            Iterator: results in same order as items, exception of task is raised when its result is reached
+        """
+        futures = [self.submit(fn, item, *args, **kwargs) for item in items]
+
+        def results():
+            try:
+                for _ in futures:
+                    yield _.result()
+            finally:
+                for _ in futures:
+                    _.cancel()
+        return results()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """Stop threads after queued tasks are done
+
+        Args:
+            wait (bool, optional): Wait until threads stop. Defaults to True.
+            cancel_futures (bool, optional): Cancel tasks are not started. Defaults to False.
+        """
+        with self.lock:
+            if self.b_shutdown:
+                return
+            self.b_shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        task = self.tasks.get_nowait()
+                    except queue.Empty:
+                        break
+                    task[0].cancel()
+            for _ in self.threads:
+                self.tasks.put(None)
+        if wait:
+            for _ in self.threads:
+                _.join()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.shutdown()
+
+
+# Idle pools of thread_execute (least recently used first), 1 call uses 1 pool alone, threads are reused by next calls.
+# Idle threads of all sizes are at most __MAX_IDLE_THREADS, least recently used pools are shut down
+__IDLE_POOLS = []
+__IDLE_POOLS_LOCK = threading.Lock()
+__MAX_IDLE_THREADS = 32
+
+
+def __acquire_pool(thread_num: int) -> WorkerPool:
+    with __IDLE_POOLS_LOCK:
+        for i in range(len(__IDLE_POOLS) - 1, -1, -1):
+            if __IDLE_POOLS[i].thread_num == thread_num:
+                return __IDLE_POOLS.pop(i)
+    return WorkerPool(thread_num=thread_num, name=f"thread_execute-{thread_num}")
+
+
+def __release_pool(pool: WorkerPool):
+    stopped = []
+    with __IDLE_POOLS_LOCK:
+        __IDLE_POOLS.append(pool)
+        idle_threads = sum(_.thread_num for _ in __IDLE_POOLS)
+        while idle_threads > __MAX_IDLE_THREADS:
+            stopped.append(__IDLE_POOLS.pop(0))
+            idle_threads -= stopped[-1].thread_num
+    for _ in stopped:
+        _.shutdown(wait=False)
+
+
+def __execute_items(*args, items=None, func=None, lock=None, output_arr=None, output_index=-1, cost_history: CostHistory = None, cancel_event=None,
+                    fail_fast=False) -> List:
+    """Job of 1 part of thread_execute, same as OtherLocalThread.run
+
+    Returns:
+        List: [(item, exception)] of failed items, exception of first failed item is raised if fail_fast
+    """
+    errors = []
+    for _ in items:
+        if cancel_event.is_set():
+            break
+        kwarg = {'item': _}
+        if lock:
+            kwarg['lock'] = lock
+        if output_arr:
+            kwarg['output_arr'] = output_arr
+            kwarg['output_index'] = output_index
+        start = time.perf_counter()
+        try:
+            func(*args, **kwarg)
+        except Exception as ex:
+            __attach_item(ex, _)
+            if fail_fast:
+                raise
+            errors.append((_, ex))
+            continue
+        if cost_history:
+            cost_history.record(_, time.perf_counter() - start)
+    return errors
+
+
+def thread_execute(*args, thread_num=5, func=None, list_arr=None, b_lock=False, b_split_arr=True, output_arr=None, cost_history: CostHistory = None, fail_fast=False):
+    """Execute by threads of a WorkerPool, threads take items from a queue. Threads are reused by next calls
 
     Args:
         thread_num (int, optional): Number of threads. Defaults to 5.
         func ([function], optional): Function execute. Function must has arg item, item is item in list_arr
         list_arr (list): list_arr
         b_lock ([bool], optional): Default to False, using threading.Lock()
-        b_split_arr ([bool], optional): Default to True, split list_arr or not
-        output_arr ([list], optional): Default to None, store output result of function
+        b_split_arr ([bool], optional): Default to True, split list_arr or not.
+            If False, list_arr is list of parts, items of 1 part are run in order by 1 thread (1 thread per part)
+        output_arr ([list], optional): Default to None, store output result of function.
+            If len(output_arr) is number of parts, func gets output_arr and output_index (index of part), items of 1 part are run by 1 thread
+        cost_history ([CostHistory], optional): Default to None, times of items are recorded and saved.
+            If items are not run by parts, they are queued longest first by their history
+        fail_fast ([bool], optional): Default to False, stop taking items when an item fails
+
+    Raises:
+        Exception: exception of failed item (ex.item is the item): first exception if fail_fast, else the only exception
+        ExecuteError: many items failed, errors is [(item, exception)]
     """
 
     if thread_num < 1:
@@ -128,33 +451,92 @@ def thread_execute(*args, thread_num=5, func=None, list_arr=None, b_lock=False,
 
     lock = threading.Lock() if b_lock else None
     list_arr_splited = split_array(list_arr, num=thread_num) if b_split_arr else list_arr
-
-    list_thread = []
-    for n, _ in enumerate(list_arr_splited):
-        if output_arr and len(output_arr) == len(list_arr_splited):
-            thread = OtherLocalThread(*args, items=_, func=func, lock=lock, output_arr=output_arr, output_index=n)
+    b_part_output = bool(output_arr) and len(output_arr) == len(list_arr_splited)
+    # Parts are run by 1 task each (1 thread per part), else items are queued one by one
+    b_part_task = b_part_output or not b_split_arr
+    parts = [(n, _) for n, _ in enumerate(list_arr_splited) if _]
+    if not parts:
+        return
+
+    pool_size = len(parts) if b_part_task else thread_num
+    b_temp_pool = WorkerPool.in_worker()
+    if b_temp_pool:
+        # Called by a task of a pool, use a private pool (idle pools are not held by nested calls)
+        pool = WorkerPool(thread_num=pool_size)
+    else:
+        pool = __acquire_pool(pool_size)
+
+    cancel_event = threading.Event()
+    errors = []
+    try:
+        if b_part_task:
+            futures = [pool.submit(__execute_items, *args, items=_, func=func, lock=lock, output_arr=output_arr if b_part_output else None, output_index=n,
+                                   cost_history=cost_history, cancel_event=cancel_event, fail_fast=fail_fast)
+                       for n, _ in parts]
         else:
-            thread = OtherLocalThread(*args, items=_, func=func, lock=lock)
-        thread.start()
-        list_thread.append(thread)
-
-    # Wait until all threads have finished
-    for _ in list_thread:
-        _.join()
+            items = [item for _, part in parts for item in part]
+            if cost_history:
+                items = [items[i] for i in cost_history.order(items)]
+            futures = [pool.submit(__execute_items, *args, items=(item,), func=func, lock=lock, cost_history=cost_history, cancel_event=cancel_event,
+                                   fail_fast=fail_fast) for item in items]
+
+        if fail_fast:
+            done, _ = wait(futures, return_when=FIRST_EXCEPTION)
+            failed = [_ for _ in futures if _ in done and not _.cancelled() and _.exception() is not None]
+            if failed:
+                # Running items finish, other items are not started
+                cancel_event.set()
+                for _ in futures:
+                    _.cancel()
+                wait(futures)
+                ex = failed[0].exception()
+                errors.append((getattr(ex, "item", None), ex))
+        else:
+            wait(futures)
+            for _ in futures:
+                ex = _.exception()
+                if ex is not None:
+                    errors.append((getattr(ex, "item", None), ex))
+                else:
+                    errors.extend(_.result())
+    finally:
+        if b_temp_pool:
+            pool.shutdown()
+        else:
+            __release_pool(pool)
+        if cost_history:
+            cost_history.save()
+    __raise_errors(errors)
 
 
-def multi_process_execute(*args, process_num=5, func=None, list_arr=None, b_split_arr=True, output_file: Path = None, b_delete_part_file=True):
-    from multiprocessing import Process, Value, Lock
-    from .file_lib import write_dict_to_json_file_simple, load_json_file
-    """Execute by multi process
+def multi_process_execute(*args, process_num=5, func=None, list_arr=None, b_split_arr=True, output_file: Path = None, b_delete_part_file=True,
+                          chunksize=100, output_jsonl: Path = None, b_result=True, cost_history: CostHistory = None, fail_fast=False) -> List:
+    from multiprocessing import Event, Process, Queue, Value, Lock
+    from multiprocessing.reduction import ForkingPickler
+    from .file_lib import write_dict_to_json_file_simple, JsonlWriter
+    """Execute by multi process, results are sent to main process by a queue
 
     Args:
         process_num (int, optional): Number of processes. Defaults to 5.
         func ([function], optional): Function execute. Function must has arg item, item is item in list_arr
         list_arr (list): list_arr
         b_split_arr ([bool], optional): Default to True, split list_arr or not
-        output_arr ([Path], optional): Default to None, file stores output data
-        b_delete_part_file ([bool], optional): Default to True, will delete part file *.xxx file
+        output_file ([Path], optional): Default to None, json file stores results (same order as list_arr)
+        b_delete_part_file ([bool], optional): Not used, results are not written to part files
+        chunksize (int, optional): Number of results are sent to main process at a time. Defaults to 100.
+        output_jsonl ([Path], optional): Default to None, JSON Lines file stores results when they are received (order of parts is not kept)
+        b_result ([bool], optional): Default to True, return results
+        cost_history ([CostHistory], optional): Default to None, processes take items from a queue, longest first by their history,
+            their times are recorded and saved
+        fail_fast ([bool], optional): Default to False, other processes stop taking items when an item fails
+
+    Raises:
+        Exception: exception of failed item (ex.item is the item) or RuntimeError of process exits with error code,
+            first exception if fail_fast, else the only exception
+        ExecuteError: many items / processes failed, errors is [(item, exception)]
+
+    Returns:
+        List: results (same order as list_arr) if b_result else None
     """
 
     class Counter(object):
@@ -170,59 +552,179 @@ def multi_process_execute(*args, process_num=5, func=None, list_arr=None, b_spli
             with self.lock:
                 return self.val.value
 
-    def process_of_thread(*args, func=None, items=None, output_file: Path = None, counter=None, process_no=-1):
-        if not items or not func:
-            return
-
-        data = []
-        for item in items:
-            params = {'item': item}
-            if 'counter' in func.__code__.co_varnames:
-                params['counter'] = counter
-            if 'process_no' in func.__code__.co_varnames:
-                params['process_no'] = process_no
-            ret = func(*args, **params)
-            if output_file:
-                data.append(ret)
-        if output_file:
-            write_dict_to_json_file_simple(output_file, data)
+    def process_of_thread(*args, func=None, items=None, start_index=0, task_queue=None, result_queue=None, b_collect=True, chunksize=100, counter=None, process_no=-1,
+                          cancel_event=None, fail_fast=False):
+        # Send results to main process: (process_no, index of first item, results, [], [], b_done, errors) or
+        # (process_no, None, results, indexes of items, seconds, b_done, errors) if items are taken from task_queue
+        # errors: [(index of item, exception, traceback)], result of failed item is None
+        # results are pickled here: unpicklable result is an item error (queue drops message it can not pickle)
+        data, indexes, seconds, errors = [], [], [], []
+        b_queue = task_queue is not None
+
+        def send(b_done):
+            try:
+                payload = ForkingPickler.dumps(data)
+            except Exception:
+                for i, ret in enumerate(data):
+                    try:
+                        ForkingPickler.dumps(ret)
+                    except Exception as ex:
+                        errors.append((indexes[i] if b_queue else start_index + i, RuntimeError(f"Result can not be pickled: {type(ex).__name__}: {ex}"),
+                                       traceback.format_exc()))
+                        data[i] = None
+                payload = ForkingPickler.dumps(data)
+            result_queue.put((process_no, None if b_queue else start_index, bytes(payload), indexes, seconds, b_done, errors))
+
+        try:
+            if not func:
+                return
+            tasks = iter(task_queue.get, None) if b_queue else enumerate(items or [], start_index)
+            for index, item in tasks:
+                if cancel_event.is_set():
+                    break
+                params = {'item': item}
+                if 'counter' in func.__code__.co_varnames:
+                    params['counter'] = counter
+                if 'process_no' in func.__code__.co_varnames:
+                    params['process_no'] = process_no
+                start = time.perf_counter()
+                try:
+                    ret = func(*args, **params)
+                except Exception as ex:
+                    try:
+                        pickle.loads(pickle.dumps(ex))
+                    except Exception:
+                        ex = RuntimeError(f"{type(ex).__name__}: {ex}")
+                    errors.append((index, ex, traceback.format_exc()))
+                    if fail_fast:
+                        cancel_event.set()
+                        break
+                    if b_queue:
+                        continue
+                    ret = None
+                if b_queue:
+                    indexes.append(index)
+                    seconds.append(time.perf_counter() - start)
+                if b_collect:
+                    data.append(ret)
+                    if len(data) >= chunksize:
+                        send(False)
+                        start_index += len(data)
+                        data, indexes, seconds, errors = [], [], [], []
+        finally:
+            send(True)
 
     if process_num < 1:
         raise AssertionError("process_num is < 1")
+    if chunksize < 1:
+        raise AssertionError("chunksize is < 1")
     if not func:
         raise AssertionError("func parameter is None.")
     if not list_arr:
         raise AssertionError("items parameter is None or empty.")
 
     list_arr_splited = split_array(list_arr, num=process_num) if b_split_arr else list_arr
+    items = [item for _ in list_arr_splited for item in _]
+    b_collect = bool(b_result or output_file or output_jsonl or cost_history)
+    result_queue = Queue()
+    task_queue = None
     list_processes = []
     if output_file:
         # Create folder of output_file
         output_file.parent.mkdir(parents=True, exist_ok=True)
     counter = Counter(0)
-    for n, v in enumerate(list_arr_splited):
-        kwargs = {
-            'items': v,
+    cancel_event = Event()
+    if cost_history:
+        # Processes take items from queue, longest first
+        process_count = process_num if b_split_arr else len(list_arr_splited)
+        task_queue = Queue()
+        for i in cost_history.order(items):
+            task_queue.put((i, items[i]))
+        for _ in range(process_count):
+            task_queue.put(None)
+        list_kwargs = [{'task_queue': task_queue} for _ in range(process_count)]
+    else:
+        list_kwargs = []
+        start_index = 0
+        for v in list_arr_splited:
+            list_kwargs.append({'items': v, 'start_index': start_index})
+            start_index += len(v)
+
+    for n, kwargs in enumerate(list_kwargs):
+        kwargs.update({
             'func': func,
+            'result_queue': result_queue,
+            'b_collect': b_collect,
+            'chunksize': chunksize,
             'counter': counter,
             'process_no': n,
-        }
-        if output_file:
-            kwargs['output_file'] = output_file.with_suffix(f"{output_file.suffix}.{n:03d}")
-
+            'cancel_event': cancel_event,
+            'fail_fast': fail_fast,
+        })
         p = Process(args=args, kwargs=kwargs, target=process_of_thread)
         list_processes.append(p)
         p.start()
 
+    # Receive results until all processes are done, queue must be read before joining processes
+    results = [None] * len(items) if b_result or output_file else None
+    writer = JsonlWriter(output_jsonl, b_append=False) if output_jsonl else None
+    pending = set(range(len(list_processes)))
+    errors = []
+    lost_processes = set()
+    try:
+        while pending:
+            try:
+                process_no, start_index, data, indexes, seconds, b_done, item_errors = result_queue.get(timeout=1.0)
+            except queue.Empty:
+                # Process is killed before it sends its last message
+                for n in list(pending):
+                    if list_processes[n].exitcode is not None and result_queue.empty():
+                        pending.discard(n)
+                        lost_processes.add(n)
+                        errors.append((None, RuntimeError(f"Process {n} exited with code {list_processes[n].exitcode} before sending its results")))
+                        if fail_fast:
+                            cancel_event.set()
+                continue
+            data = pickle.loads(data)
+            for index, ex, tb in item_errors:
+                __attach_item(ex, items[index])
+                if hasattr(ex, "add_note"):
+                    ex.add_note(f"Process {process_no}: {tb}")
+                errors.append((items[index], ex))
+                if fail_fast:
+                    cancel_event.set()
+            if start_index is not None:
+                if results is not None:
+                    results[start_index:start_index + len(data)] = data
+            else:
+                for index, ret, second in zip(indexes, data, seconds):
+                    if results is not None:
+                        results[index] = ret
+                    cost_history.record(items[index], second)
+            if writer:
+                writer.write_many(data)
+            if b_done:
+                pending.discard(process_no)
+    finally:
+        if writer:
+            writer.close()
+        if cost_history:
+            cost_history.save()
+
     # completing process
     for p in list_processes:
         p.join()
+    if task_queue is not None:
+        # Items are not taken if processes are stopped
+        task_queue.cancel_join_thread()
+
+    for n, p in enumerate(list_processes):
+        if p.exitcode != 0 and n not in lost_processes:
+            errors.append((None, RuntimeError(f"Process {n} exited with code {p.exitcode}")))
+    __raise_errors(errors[:1] if fail_fast else errors)
 
+    if results is None:
+        return None
     if output_file:
-        data = []
-        for n, v in enumerate(list_arr_splited):
-            n_file = output_file.with_suffix(f"{output_file.suffix}.{n:03d}")
-            data.extend(load_json_file(n_file))
-            if b_delete_part_file:
-                os.remove(n_file)
-        write_dict_to_json_file_simple(output_file, data)
\ No newline at end of file
+        write_dict_to_json_file_simple(output_file, results)
+    return results if b_result else None
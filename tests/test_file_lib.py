@@ -0,0 +1,99 @@
+"""Tests of my_lib.file_lib
+
+python -m pytest tests
+"""
+import os
+import zipfile
+
+import pytest
+
+from my_lib import file_lib
+from my_lib.file_lib import create_zip, extract_zip, sync_folder
+
+
+def test_sync_folder_type_conflicts(tmp_path):
+    src, dest = tmp_path / "src", tmp_path / "dest"
+    (src / "a").mkdir(parents=True)
+    (src / "a" / "x.txt").write_text("x")
+    (src / "b").write_text("b")
+    (src / "keep").mkdir()
+    (src / "keep" / "moved.txt").write_text("moved")
+    # a is a file in dest, b is a folder in dest
+    dest.mkdir()
+    (dest / "a").write_text("old a")
+    (dest / "b" / "sub").mkdir(parents=True)
+    (dest / "b" / "sub" / "moved.txt").write_text("moved")
+    (dest / "b" / "old.txt").write_text("old")
+
+    plan = sync_folder(src, dest, delete_extraneous=True, dry_run=True)
+    assert sorted(map(str, plan['conflicts'])) == ['a', 'b']
+    # Entries under conflicts are not deleted or renamed again
+    assert plan['deleted'] == [] and plan['deleted_folders'] == [] and plan['renamed'] == []
+
+    sync_folder(src, dest, delete_extraneous=True)
+    assert (dest / "a" / "x.txt").read_text() == "x"
+    assert (dest / "b").read_text() == "b"
+    assert (dest / "keep" / "moved.txt").read_text() == "moved"
+    assert sorted(os.listdir(dest)) == ['a', 'b', 'keep']
+    plan = sync_folder(src, dest, delete_extraneous=True, dry_run=True)
+    assert plan['conflicts'] == [] and plan['new'] == [] and plan['changed'] == []
+
+
+def test_sync_folder_type_conflicts_without_delete(tmp_path):
+    src, dest = tmp_path / "src", tmp_path / "dest"
+    (src / "a" / "b").mkdir(parents=True)
+    (src / "a" / "b" / "c.txt").write_text("c")
+    (dest / "a").mkdir(parents=True)
+    (dest / "a" / "b").write_text("old b")
+    (dest / "a" / "other.txt").write_text("other")
+
+    sync_folder(src, dest)
+    assert (dest / "a" / "b" / "c.txt").read_text() == "c"
+    assert (dest / "a" / "other.txt").read_text() == "other"
+
+
+def __make_zip_source(folder):
+    (folder / "sub").mkdir(parents=True)
+    (folder / "a.txt").write_text("text " * 10000)
+    (folder / "sub" / "b.bin").write_bytes(os.urandom(100000))
+    (folder / "sub" / "c.png").write_bytes(os.urandom(1000))
+    (folder / "empty.txt").write_bytes(b"")
+
+
+@pytest.mark.parametrize("workers, b_internals", [(1, True), (4, True), (4, False)])
+def test_create_zip_round_trip(tmp_path, monkeypatch, workers, b_internals):
+    src = tmp_path / "src"
+    __make_zip_source(src)
+    if workers > 1 and b_internals:
+        with zipfile.ZipFile(tmp_path / "check.zip", "w") as zf:
+            if not file_lib.__zip_can_write_compressed(zf):
+                pytest.skip("internals of zipfile.ZipFile are changed, parallel path is not used")
+    if not b_internals:
+        # Internals of ZipFile are changed, create_zip falls back to public API
+        monkeypatch.setattr(file_lib, "__zip_can_write_compressed", lambda zf: False)
+    create_zip(src, tmp_path / "out.zip", workers=workers)
+
+    with zipfile.ZipFile(tmp_path / "out.zip") as zf:
+        assert zf.testzip() is None
+        types = {_.filename: _.compress_type for _ in zf.infolist()}
+    assert types == {"a.txt": zipfile.ZIP_DEFLATED, "empty.txt": zipfile.ZIP_DEFLATED,
+                     os.path.join("sub", "b.bin").replace(os.sep, "/"): zipfile.ZIP_DEFLATED,
+                     os.path.join("sub", "c.png").replace(os.sep, "/"): zipfile.ZIP_STORED}
+    extract_zip(tmp_path / "out.zip", tmp_path / "dst")
+    for _ in ["a.txt", "empty.txt", "sub/b.bin", "sub/c.png"]:
+        assert (tmp_path / "dst" / _).read_bytes() == (src / _).read_bytes()
+
+
+def test_sync_folder_rename_is_idempotent(tmp_path):
+    src, dest = tmp_path / "src", tmp_path / "dest"
+    src.mkdir()
+    (src / "new.txt").write_text("same content")
+    dest.mkdir()
+    (dest / "old.txt").write_text("same content")
+    os.utime(dest / "old.txt", (1000000000, 1000000000))
+
+    plan = sync_folder(src, dest, delete_extraneous=True)
+    assert [tuple(map(str, _)) for _ in plan['renamed']] == [("old.txt", "new.txt")]
+    assert os.listdir(dest) == ["new.txt"]
+    plan = sync_folder(src, dest, delete_extraneous=True, dry_run=True)
+    assert plan['changed'] == [] and plan['new'] == [] and plan['renamed'] == []